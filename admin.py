@@ -0,0 +1,105 @@
+import functools
+import io
+import logging
+from telegram import Update
+from telegram.ext import ContextTypes
+from config import ADMIN_IDS, PRAYERS
+from utils import _, user_lang
+import profiler
+import metrics
+from stats import stats_for
+from subscriptions import index_for
+from broadcast import city_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_SECONDS = 10
+
+
+def admin_only(handler):
+    """Ignore a command unless it comes from a user listed in ADMIN_IDS"""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user or user.id not in ADMIN_IDS:
+            return
+        return await handler(update, context)
+    return wrapper
+
+
+@admin_only
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile <seconds>: sample the live loop and reply with the report as a file"""
+    lang = user_lang(context)
+    try:
+        seconds = int(context.args[0]) if context.args else DEFAULT_PROFILE_SECONDS
+    except ValueError:
+        seconds = DEFAULT_PROFILE_SECONDS
+
+    if profiler.is_running():
+        await update.message.reply_text(_("profile_busy", lang))
+        return
+
+    seconds = max(1, min(seconds, profiler.MAX_SECONDS))
+    await update.message.reply_text(_("profiling", lang, seconds))
+    logger.info("Profiling requested by %s for %ss", update.effective_user.id, seconds)
+    report = await profiler.run_profile(seconds)
+    await update.message.reply_document(
+        document=io.BytesIO(report.encode()),
+        filename="profile.txt",
+    )
+
+
+TOP_CITIES = 10
+
+
+@admin_only
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats: subscriber and delivery figures from live counters"""
+    index = index_for(context.application)
+    stats = stats_for(context.application)
+    deliveries = stats.deliveries
+    summary = index.stats()
+    subscribers = summary["subscribers"]
+    muted_pct = 100 * summary["muted"] / subscribers if subscribers else 0
+
+    lines = [
+        "📊 Stats",
+        f"Subscribers: {subscribers} ({summary['broadcasts']} groups/channels)",
+        f"Muted: {summary['muted']} ({muted_pct:.1f}%)",
+        f"Dormant (blocked/deleted): {summary['dormant']}, {stats.get('chats_pruned')} pruned since start",
+        f"Parameter tuples: {summary['tuples']} across {summary['cities']} cities "
+        f"({summary['shared_ratio']} chats per tuple)",
+        "",
+        "Languages: " + ", ".join(f"{lang} {count}" for lang, count in index.lang_counts.most_common()),
+        "",
+        "Top cities:",
+    ]
+    lines += [f"  {city}: {count}" for city, count in index.city_counts.most_common(TOP_CITIES)]
+
+    lines += ["", "Sends per day:"]
+    for day, sent, failed in deliveries.snapshot():
+        lines.append(f"  {day}: {sum(sent.values())} sent, {sum(failed.values())} failed")
+
+    sent, failed = deliveries.totals()
+    lines += ["", f"Per prayer (last {deliveries.days} days):"]
+    for prayer in PRAYERS:
+        attempts = sent[prayer] + failed[prayer]
+        rate = 100 * failed[prayer] / attempts if attempts else 0
+        lines.append(f"  {prayer}: {sent[prayer]} sent, {failed[prayer]} failed ({rate:.1f}%)")
+
+    broadcasts = city_stats(context.application)
+    if broadcasts:
+        lines += ["", "Broadcast reach:"]
+        for city, entry in sorted(broadcasts.items(), key=lambda item: -item[1]["reach"]):
+            lines.append(
+                f"  {city}: {entry['broadcasts']} chats, {entry['reach']} members, "
+                f"{entry['dms_avoided']} DMs avoided"
+            )
+
+    lines += ["", f"Error fingerprints: {metrics.get('error_fingerprints_new')}"]
+    stalls = {name: count for name, count in metrics.snapshot().items() if name.startswith("loop_stalls{")}
+    lines.append(f"Loop lag: {metrics.get('loop_lag_ms')} ms now, {metrics.get('loop_lag_max_ms')} ms max")
+    for name, count in sorted(stalls.items(), key=lambda item: -item[1])[:TOP_CITIES]:
+        lines.append(f"  {count} stalls in {name[len('loop_stalls{owner='):-1]}")
+    await update.message.reply_text("\n".join(lines))
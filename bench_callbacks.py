@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: cost of picking the handler for one callback query.
+
+Compares the previous chain of regex CallbackQueryHandlers (tried in
+registration order, as the Application does) with the single CallbackRouter.
+Only the matching step is timed; the handlers themselves never run.
+
+Usage:
+    python3 bench_callbacks.py [iterations]
+"""
+import sys
+import time
+from telegram import Update
+from telegram.ext import CallbackQueryHandler
+from fake_api import BOT_USER
+from callbacks import CallbackRouter, CODES, pack
+
+
+async def _noop(update, context):
+    pass
+
+
+# The handler chain as registered before the router existed
+REGEX_CHAIN = [
+    CallbackQueryHandler(_noop, pattern=pattern)
+    for pattern in (
+        "toggle_mute", "toggle_lang", r"^set_lang_", r"^city_.*", r"^choose_method$", r"^method_\d+$",
+        r"^toggle_school$", r"^toggle_iftar$", "close", "refresh", "choose_city", "settings",
+    )
+]
+
+LEGACY_DATA = [
+    "toggle_mute", "toggle_lang", "set_lang_en", "city_Cairo", "choose_method", "method_4",
+    "toggle_school", "toggle_iftar", "close", "refresh", "choose_city", "settings",
+]
+CURRENT_DATA = [
+    pack("toggle_mute"), pack("toggle_lang"), pack("set_lang", "en"), pack("city", "Cairo"),
+    pack("choose_method"), pack("method", 4), pack("toggle_school"), pack("toggle_iftar"),
+    pack("close"), pack("refresh"), pack("choose_city"), pack("settings"),
+]
+
+
+def _update(data: str) -> Update:
+    return Update.de_json({
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "from": {"id": 1, "is_bot": False, "first_name": "bench"},
+            "chat_instance": "1",
+            "data": data,
+            "message": {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}, "from": BOT_USER, "text": "menu"},
+        },
+    }, None)
+
+
+def _chain_match(update):
+    for handler in REGEX_CHAIN:
+        result = handler.check_update(update)
+        if result is not None and result is not False:
+            return handler
+    return None
+
+
+def _bench(match, updates, iterations: int) -> float:
+    """Mean nanoseconds per callback"""
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        for update in updates:
+            match(update)
+    return (time.perf_counter_ns() - start) / (iterations * len(updates))
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    router = CallbackRouter({action: _noop for action in CODES})
+    legacy = [_update(data) for data in LEGACY_DATA]
+    current = [_update(data) for data in CURRENT_DATA]
+
+    rows = [
+        ("regex chain, legacy data", _bench(_chain_match, legacy, iterations)),
+        ("router, current data", _bench(router.check_update, current, iterations)),
+        ("router, legacy data", _bench(router.check_update, legacy, iterations)),
+    ]
+    print(f"{len(LEGACY_DATA)} callbacks x {iterations} iterations")
+    for label, ns in rows:
+        print(f"  {label:<26}: {ns:8.0f} ns/callback")
+
+
+if __name__ == "__main__":
+    main()
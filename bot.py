@@ -3,7 +3,7 @@ import logging
 import asyncio
 import sys
 import os
-import subprocess
+import signal
 from telegram import BotCommand
 from telegram.ext import (
     Application,
@@ -12,12 +12,19 @@ from telegram.ext import (
 from telegram.error import TelegramError, NetworkError, TimedOut
 from handlers import setup_handlers
 from jobs import restore_jobs
-from config import BOT_TOKEN
+from subscriptions import params_key, index_for
+from utils import get_prayer_times
+from control import ControlServer, read_pid_file, write_pid_file, remove_pid_file
+from prefetch import schedule_prefetch
+from ramadan import schedule_ramadan
+from errors import flush_error_summary, SUMMARY_WINDOW
+from outbox import attach as attach_outbox, outbox_for, replay, retry_pending, RETRY_INTERVAL as OUTBOX_RETRY_INTERVAL
+from config import BOT_TOKEN, LOG_LEVEL, LOG_FORMAT, LAZY_USER_DATA, LOOP_LAG_THRESHOLD_MS
+from loop_watchdog import LoopWatchdog
+from lazy_persistence import LazyPicklePersistence, evict_idle_users, EVICT_INTERVAL
+from log_pipeline import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-)
+setup_logging(level=LOG_LEVEL, json_output=LOG_FORMAT == "json")
 log = logging.getLogger(__name__)
 
 async def setup_commands(app):
@@ -41,6 +48,8 @@ async def setup_commands(app):
             BotCommand("today", "مواقيت اليوم / Today's Times"),
             BotCommand("settings", "الإعدادات / Settings"),
             BotCommand("lang", "تغيير اللغة / Change language"),
+            BotCommand("timetable", "جدول الشهر / Monthly timetable"),
+            BotCommand("broadcast", "البث في مجموعة/قناة / Group & channel posts"),
         ]
         await app.bot.set_my_commands(cmds)
         log.info("✅ Bot commands set successfully")
@@ -88,37 +97,130 @@ async def validate_bot_token():
 
 def check_existing_process():
     """Check if another bot instance is already running"""
+    pid = read_pid_file()
+    if pid and pid != os.getpid():
+        log.error(f"❌ Another bot instance is running (PID: {pid})")
+        log.error("Please stop the other instance first:")
+        log.error("python3 manage_bot.py stop")
+        return False
+    return True
+
+def build_application(token: str, persistence_file: str = "bot_data.pickle") -> Application:
+    """Build a fully configured Application; several may share one process"""
+    if LAZY_USER_DATA:
+        persistence = LazyPicklePersistence(persistence_file)
+    else:
+        persistence = PicklePersistence(persistence_file)
+    app = (
+        Application.builder()
+        .token(token)
+        .persistence(persistence)
+        .post_init(setup_commands)
+        .build()
+    )
+
+    schedule_prefetch(app)
+    schedule_ramadan(app)
+    if LAZY_USER_DATA:
+        app.job_queue.run_repeating(evict_idle_users, interval=EVICT_INTERVAL, name="evict_users")
+    app.job_queue.run_repeating(flush_error_summary, interval=SUMMARY_WINDOW, name="error_summary")
+    attach_outbox(app, f"{persistence_file}.outbox.sqlite")
+    app.job_queue.run_repeating(retry_pending, interval=OUTBOX_RETRY_INTERVAL, name="outbox_retry")
+
+    setup_handlers(app)
+    return app
+
+WARM_CONCURRENCY = 8
+
+async def warm_timings(keys):
+    """Fetch today's timings for every (city, country, method, school) before taking traffic"""
+    semaphore = asyncio.Semaphore(WARM_CONCURRENCY)
+
+    async def warm(city, country, method, school):
+        async with semaphore:
+            await asyncio.to_thread(get_prayer_times, city, country, None, method, school)
+
+    await asyncio.gather(*(warm(*key) for key in set(keys)))
+
+async def serve(app, standby: bool = False, persistence_file: str = "bot_data.pickle"):
+    """Run the bot, optionally as a warm standby that waits for a handoff"""
+    control = ControlServer(app, standby=standby)
+    await control.start()
+    watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD_MS / 1000) if LOOP_LAG_THRESHOLD_MS else None
+    if watchdog:
+        watchdog.start()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, control.stopped.set)
+
     try:
-        # Get current process ID
-        current_pid = os.getpid()
-        
-        # Find other bot processes
-        result = subprocess.run(
-            ["pgrep", "-f", "python.*bot.py"],
-            capture_output=True,
-            text=True
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
-            pids = [int(pid) for pid in result.stdout.strip().split('\n') if pid.strip()]
-            other_pids = [pid for pid in pids if pid != current_pid]
-            
-            if other_pids:
-                log.error(f"❌ Another bot instance is running (PID: {other_pids[0]})")
-                log.error("Please stop the other instance first:")
-                log.error(f"kill {other_pids[0]}")
-                return False
-        
-        return True
-    except Exception as e:
-        log.warning(f"⚠️  Could not check for existing processes: {e}")
-        return True  # Continue anyway
+        if standby:
+            # Warm everything that doesn't depend on the live process's state
+            await app.bot.initialize()
+            snapshot = await PicklePersistence(persistence_file).get_bot_data()
+            keys = [record[:4] for record in snapshot.get("subscribers", {}).values()]
+            keys += [params_key(data) for data in snapshot.get("broadcasts", {}).values()]
+            await warm_timings(keys)
+            log.info("⏸️  Standby ready with %d warm keys; waiting for takeover", len(set(keys)))
+
+            waiters = [asyncio.ensure_future(control.takeover.wait()), asyncio.ensure_future(control.stopped.wait())]
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+            if control.stopped.is_set():
+                return
+
+            try:
+                # The old instance is still draining its fan-out: hold the outbox replay until it has exited
+                outbox_for(app).previous_pid = read_pid_file()
+                # Poll first, so updates queue up while the persistence the old instance just flushed loads
+                await app.updater.initialize()
+                await app.updater.start_polling(drop_pending_updates=False)
+                await app.initialize()
+                await restore_jobs(app)
+                await app.start()
+            except Exception:
+                control.stopped.set()
+                raise
+            write_pid_file()
+            control.started.set()
+            # Whatever a previous run queued but never delivered goes out in the background
+            app.create_task(replay(app))
+            log.info("✅ Took over polling")
+            if app.post_init:
+                await app.post_init(app)
+        else:
+            await app.initialize()
+            if app.post_init:
+                await app.post_init(app)
+            await restore_jobs(app)
+            await app.updater.start_polling(drop_pending_updates=True)
+            await app.start()
+            write_pid_file()
+            app.create_task(replay(app))
+            # Take traffic first; a cold key costs one fetch on first use anyway
+            app.create_task(warm_timings(index_for(app).chats))
+
+        await control.stopped.wait()
+    finally:
+        if app.updater.running:
+            await app.updater.stop()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await control.close()
+        if watchdog:
+            await watchdog.stop()
+        remove_pid_file()
 
 def main():
     """Main function with improved error handling"""
     
+    # A standby instance deliberately runs next to the active one until handoff
+    standby = "--standby" in sys.argv[1:]
+
     # Check for existing bot processes
-    if not check_existing_process():
+    if not standby and not check_existing_process():
         sys.exit(1)
     
     # Basic token check without async validation
@@ -130,29 +232,11 @@ def main():
     log.info("🚀 Starting Azan Time Bot...")
     
     try:
-        persistence = PicklePersistence("bot_data.pickle")
-        app = (
-            Application.builder()
-            .token(BOT_TOKEN)
-            .persistence(persistence)
-            .post_init(setup_commands)
-            .build()
-        )
-
-        app.job_queue.run_once(
-            lambda ctx: asyncio.create_task(restore_jobs(ctx.application)), when=1
-        )
-
-        setup_handlers(app)
+        app = build_application(BOT_TOKEN)
         
         log.info("✅ Bot setup complete. Starting polling...")
         
-        # Run with better error handling and retry logic
-        app.run_polling(
-            allowed_updates=None,
-            drop_pending_updates=True,
-            close_loop=False
-        )
+        asyncio.run(serve(app, standby=standby))
         
     except KeyboardInterrupt:
         log.info("🛑 Bot stopped by user")
@@ -171,7 +255,7 @@ def main():
         elif "Conflict" in str(e):
             log.error("Another instance of the bot is already running or webhook is set")
             log.error("Solutions:")
-            log.error("1. Kill other bot instances: pkill -f 'python.*bot.py'")
+            log.error("1. Stop the other bot instance: python3 manage_bot.py stop")
             log.error("2. Clear webhook: python3 clear_webhook.py")
             log.error("3. Wait a few seconds and try again")
         sys.exit(1)
@@ -0,0 +1,132 @@
+import logging
+from telegram import Update, ChatMember
+from telegram.constants import ChatType
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes
+from utils import _, user_lang, calc_params, city_name, format_timings, get_prayer_times
+from subscriptions import index_for
+from stats import stats_for
+from gazetteer import canonical_city
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATUSES = (ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+async def _is_admin(bot, chat_id: int, user_id: int) -> bool:
+    try:
+        member = await bot.get_chat_member(chat_id, user_id)
+    except TelegramError:
+        return False
+    return member.status in ADMIN_STATUSES
+
+
+async def broadcast_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Subscribe a group or channel to azan posts for a city (admins only)"""
+    lang = user_lang(context)
+    args = list(context.args or [])
+    chat = update.effective_chat
+
+    if chat.type == ChatType.PRIVATE:
+        # Channels can't run commands themselves, so their admins configure them from a DM
+        if not args or not (args[0].startswith("@") or args[0].lstrip("-").isdigit()):
+            await update.message.reply_text(_("broadcast_usage", lang), parse_mode="Markdown")
+            return
+        try:
+            target = await context.bot.get_chat(args.pop(0))
+        except TelegramError:
+            await update.message.reply_text(_("broadcast_usage", lang), parse_mode="Markdown")
+            return
+    else:
+        target = chat
+
+    if not await _is_admin(context.bot, target.id, update.effective_user.id):
+        await update.message.reply_text(_("admin_only", lang))
+        return
+
+    broadcasts = context.bot_data.setdefault("broadcasts", {})
+    index = index_for(context.application)
+    title = target.title or target.username or str(target.id)
+    record = broadcasts.get(target.id)
+
+    if not args:
+        if record:
+            muted = _("broadcast_muted", lang) if record.get("muted") else ""
+            await update.message.reply_text(
+                _("broadcast_status", lang, title, city_name(record["city"], lang), record.get("members", 0), muted),
+                parse_mode="Markdown",
+            )
+        else:
+            await update.message.reply_text(_("broadcast_usage", lang), parse_mode="Markdown")
+        return
+
+    command = args[0].lower()
+    if command == "off":
+        if broadcasts.pop(target.id, None):
+            index.unsubscribe(target.id)
+        await update.message.reply_text(_("broadcast_stopped", lang, title), parse_mode="Markdown")
+        return
+
+    if command == "mute":
+        if not record:
+            await update.message.reply_text(_("broadcast_usage", lang), parse_mode="Markdown")
+            return
+        record["muted"] = not record.get("muted", False)
+        index.update_flags(target.id, record)
+        muted = _("broadcast_muted", lang) if record["muted"] else ""
+        await update.message.reply_text(
+            _("broadcast_status", lang, title, city_name(record["city"], lang), record.get("members", 0), muted),
+            parse_mode="Markdown",
+        )
+        return
+
+    if target.type == ChatType.CHANNEL and not await _is_admin(context.bot, target.id, context.bot.id):
+        await update.message.reply_text(_("bot_not_admin", lang, title))
+        return
+
+    # Known cities share the subscription key (and notify job) of DM subscribers to the same city
+    city, country = canonical_city(" ".join(args)) or (" ".join(args), "")
+    method, school = calc_params(context.user_data)
+    times = get_prayer_times(city, country, method=method, school=school)
+    if not times:
+        await update.message.reply_text(_("error_fetch", lang) + f" ({city})")
+        return
+
+    try:
+        # Every member but the bot itself would otherwise need a direct message
+        members = max(0, await context.bot.get_chat_member_count(target.id) - 1)
+    except TelegramError:
+        members = 0
+
+    record = {
+        "city": city,
+        "country": country,
+        "method": method,
+        "school": school,
+        "lang": lang,
+        "muted": False,
+        "members": members,
+        "title": title,
+    }
+    broadcasts[target.id] = record
+    index.subscribe(target.id, record, broadcast=True)
+    logger.info("Broadcast chat %s subscribed to %s (%d members)", target.id, city, members)
+
+    await update.message.reply_text(
+        _("broadcast_saved", lang, title, city_name(city, lang), format_timings(times, lang)),
+        parse_mode="Markdown",
+    )
+
+
+def city_stats(app) -> dict:
+    """Per-city broadcast reach and how many direct messages it saved"""
+    stats, counters = {}, stats_for(app)
+    for record in app.bot_data.get("broadcasts", {}).values():
+        city = record["city"]
+        entry = stats.setdefault(city, {"broadcasts": 0, "reach": 0})
+        entry["broadcasts"] += 1
+        entry["reach"] += record.get("members", 0)
+    for city, entry in stats.items():
+        entry["posts"] = counters.get("broadcast_posts", city=city)
+        entry["dms_avoided"] = counters.get("dms_avoided", city=city)
+    return stats
@@ -0,0 +1,90 @@
+"""
+callback_data scheme and a single dict-based dispatcher for inline buttons.
+
+New buttons carry ``"<version>:<code>[:<arg>]"``, e.g. ``"1:m:4"`` for
+"calculation method 4". The router splits the string once and looks the
+code up in a dict, instead of trying a chain of regex handlers in order.
+Buttons sent before the scheme existed (``"settings"``, ``"city_Cairo"``,
+``"set_lang_en"``...) are still on users' screens, so they are translated
+through LEGACY before dispatch.
+"""
+from telegram import Update
+from telegram.ext import BaseHandler
+
+VERSION = "1"
+SEP = ":"
+
+# action name -> short code used on the wire (keep codes stable once shipped)
+CODES = {
+    "settings": "s",
+    "close": "x",
+    "refresh": "r",
+    "choose_city": "cc",
+    "city": "c",
+    "enter_city": "ec",
+    "toggle_mute": "tm",
+    "toggle_lang": "tl",
+    "set_lang": "l",
+    "choose_method": "cm",
+    "method": "m",
+    "toggle_school": "ts",
+    "toggle_iftar": "ti",
+    "choose_prayers": "cp",
+    "toggle_prayer": "tp",
+    "cycle_quiet": "cq",
+}
+
+_ACTIONS = {code: action for action, code in CODES.items()}
+
+# Pre-scheme callback_data: exact values, then the few that carried an argument
+LEGACY = {name: name for name in CODES if name not in ("city", "set_lang", "method", "choose_prayers", "toggle_prayer", "cycle_quiet")}
+LEGACY_PREFIXES = (("city_", "city"), ("set_lang_", "set_lang"), ("method_", "method"))
+
+
+def pack(action: str, *args) -> str:
+    """callback_data for `action` with optional arguments (max 64 bytes in total)"""
+    return SEP.join((VERSION, CODES[action], *map(str, args)))
+
+
+def unpack(data: str):
+    """(action, [args]) for current and legacy callback_data, or (None, []) if unknown"""
+    version, sep, rest = data.partition(SEP)
+    if sep and version == VERSION:
+        code, _, arg = rest.partition(SEP)
+        return _ACTIONS.get(code), [arg] if arg else []
+    if data in LEGACY:
+        return LEGACY[data], []
+    for prefix, action in LEGACY_PREFIXES:
+        if data.startswith(prefix):
+            return action, [data[len(prefix):]]
+    return None, []
+
+
+class CallbackRouter(BaseHandler):
+    """Routes every callback query to its action's callback; args land in context.args"""
+
+    def __init__(self, routes: dict = None, block: bool = True):
+        super().__init__(self._unrouted, block=block)
+        self.routes = dict(routes or {})
+
+    def route(self, action: str, callback):
+        if action not in CODES:
+            raise KeyError(f"Unknown callback action {action!r}")
+        self.routes[action] = callback
+
+    async def _unrouted(self, update, context):
+        return None
+
+    def check_update(self, update):
+        if not isinstance(update, Update) or not update.callback_query or update.callback_query.data is None:
+            return None
+        action, args = unpack(update.callback_query.data)
+        callback = self.routes.get(action)
+        return (callback, args) if callback else None
+
+    def collect_additional_context(self, context, update, application, check_result):
+        context.args = check_result[1]
+
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        return await check_result[0](update, context)
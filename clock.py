@@ -0,0 +1,52 @@
+"""
+Wall clock used by the scheduling code, swappable for a virtual one.
+
+Everything that decides *when* something happens (due prayers, local dates,
+prefetch windows, Ramadan mode) reads the time through ``clock.now()`` so
+simulate.py can replay days of notifications without waiting for them.
+"""
+import datetime
+
+
+class SystemClock:
+    def now(self, tz=None) -> datetime.datetime:
+        return datetime.datetime.now(tz)
+
+
+class VirtualClock:
+    """A clock that only moves when told to"""
+
+    def __init__(self, start: datetime.datetime):
+        if start.tzinfo is None:
+            raise ValueError("VirtualClock needs a timezone-aware start time")
+        self._now = start.astimezone(datetime.timezone.utc)
+
+    def now(self, tz=None) -> datetime.datetime:
+        if tz is None:
+            # Naive local time, as datetime.now() would return
+            return self._now.astimezone().replace(tzinfo=None)
+        return self._now.astimezone(tz)
+
+    def set(self, moment: datetime.datetime):
+        self._now = moment.astimezone(datetime.timezone.utc)
+
+    def advance(self, seconds: float):
+        self._now += datetime.timedelta(seconds=seconds)
+
+
+_clock = SystemClock()
+
+
+def use(clock):
+    """Install a clock for the whole process; returns the previous one"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def now(tz=None) -> datetime.datetime:
+    return _clock.now(tz)
+
+
+def today() -> datetime.date:
+    return _clock.now().date()
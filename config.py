@@ -4,6 +4,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
+# Several bots in one process: BOT_TOKENS=egypt=123:abc,turkey=456:def
+BOT_TOKENS = dict(
+    entry.strip().split("=", 1) for entry in os.getenv("BOT_TOKENS", "").split(",") if "=" in entry
+)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+RAMADAN_MODE = os.getenv("RAMADAN_MODE", "auto")  # "auto", "on" or "off"
+# Log and count event-loop stalls longer than this (0 turns the watchdog off)
+LOOP_LAG_THRESHOLD_MS = int(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+# Keep idle users' data on disk and load it on demand (see lazy_persistence.py)
+LAZY_USER_DATA = os.getenv("LAZY_USER_DATA", "0") == "1"
+# Telegram user ids allowed to run admin commands: ADMIN_IDS=123,456
+ADMIN_IDS = {int(uid) for uid in os.getenv("ADMIN_IDS", "").split(",") if uid.strip().isdigit()}
 
 TEXTS = {
     "start": {
@@ -30,44 +43,105 @@ TEXTS = {
     "today": {"ar": "📅 مواقيت اليوم", "en": "📅 Today's Times"},
     "azan_now": {"ar": "🔔 **{}** حان الآن في **{}**", "en": "🔔 **{}** time now in **{}**"},
     "back": {"ar": "🔙 رجوع", "en": "🔙 Back"},
+    "calc_method": {"ar": "🧮 طريقة الحساب: {}", "en": "🧮 Calculation method: {}"},
+    "choose_method": {"ar": "🧮 اختر طريقة الحساب:", "en": "🧮 Choose calculation method:"},
+    "asr_school": {"ar": "🌇 العصر: {}", "en": "🌇 Asr: {}"},
+    "school_0": {"ar": "الجمهور (شافعي)", "en": "Standard (Shafi'i)"},
+    "school_1": {"ar": "حنفي", "en": "Hanafi"},
+    "broadcast_usage": {
+        "ar": "📢 **وضع البث**\n/broadcast <المدينة> — نشر الأذان في هذه المجموعة\n/broadcast mute — إيقاف/استئناف\n/broadcast off — إلغاء\n\nللقنوات أرسل في الخاص: /broadcast @القناة <المدينة>",
+        "en": "📢 **Broadcast mode**\n/broadcast <city> — post azan alerts in this group\n/broadcast mute — pause/resume\n/broadcast off — stop\n\nFor a channel, send in private: /broadcast @channel <city>",
+    },
+    "broadcast_saved": {"ar": "📢 ستُنشر مواعيد الأذان في **{}** لمدينة **{}**\n\n{}", "en": "📢 **{}** will receive azan posts for **{}**\n\n{}"},
+    "broadcast_status": {"ar": "📢 **{}**: {} ({} عضو){}", "en": "📢 **{}**: {} ({} members){}"},
+    "broadcast_stopped": {"ar": "📢 تم إيقاف البث في **{}**", "en": "📢 Azan posts stopped for **{}**"},
+    "broadcast_muted": {"ar": " — 🔕 متوقف مؤقتاً", "en": " — 🔕 paused"},
+    "admin_only": {"ar": "⛔ هذا الأمر لمشرفي المحادثة فقط", "en": "⛔ Only chat admins can change broadcast settings"},
+    "bot_not_admin": {"ar": "⚠️ أضفني كمشرف في {} حتى أتمكن من النشر", "en": "⚠️ Add me as an admin of {} so I can post there"},
+    "ramadan_times": {"ar": "🌙 **الإمساك**: {}\n🍽️ **الإفطار**: {}\n⏳ {} على {}", "en": "🌙 **Imsak**: {}\n🍽️ **Iftar**: {}\n⏳ {} until {}"},
+    "imsak": {"ar": "الإمساك", "en": "Imsak"},
+    "iftar": {"ar": "الإفطار", "en": "Iftar"},
+    "iftar_now": {"ar": "🍽️ حان موعد **الإفطار** في **{}**، تقبل الله صيامكم", "en": "🍽️ **Iftar** time now in **{}** — may your fast be accepted"},
+    "iftar_alert_on": {"ar": "🍽️ تنبيه الإفطار: مفعل", "en": "🍽️ Iftar alert: on"},
+    "iftar_alert_off": {"ar": "🍽️ تنبيه الإفطار: متوقف", "en": "🍽️ Iftar alert: off"},
+    "prayers_button": {"ar": "🕌 الصلوات: {}", "en": "🕌 Prayers: {}"},
+    "prayers_all": {"ar": "الكل", "en": "all"},
+    "prayers_none": {"ar": "لا شيء", "en": "none"},
+    "choose_prayers": {"ar": "🕌 اختر الصلوات التي تريد التنبيه لها:", "en": "🕌 Choose which prayers to be alerted for:"},
+    "quiet_off": {"ar": "🌙 ساعات الهدوء: متوقفة", "en": "🌙 Quiet hours: off"},
+    "quiet_on": {"ar": "🌙 ساعات الهدوء: {:02d}:00–{:02d}:00", "en": "🌙 Quiet hours: {:02d}:00–{:02d}:00"},
+    "profiling": {"ar": "⏱️ جارٍ التحليل لمدة {} ثانية...", "en": "⏱️ Profiling for {} seconds..."},
+    "share_location": {"ar": "📍 مشاركة الموقع", "en": "📍 Share location"},
+    "nearest_city_far": {"ar": "📍 أقرب مدينة معروفة هي **{}** وتبعد حوالي {} كم. اكتب اسم مدينتك للحصول على مواقيت أدق.", "en": "📍 The nearest known city is **{}**, about {} km away. Type your city's name for more precise times."},
+    "timetable_caption": {"ar": "🗓️ مواقيت الصلاة في **{}** لشهر {}", "en": "🗓️ Prayer times in **{}** for {}"},
+    "profile_busy": {"ar": "⏱️ يوجد تحليل قيد التشغيل بالفعل", "en": "⏱️ A profile is already running"},
+    "operation_cancelled": {"ar": "❌ تم إلغاء العملية", "en": "❌ Operation cancelled"},
+    "change_lang": {"ar": "🌐 اللغة", "en": "🌐 Language"},
+    "hijri_suffix": {"ar": "هـ", "en": "AH"},
+    "remaining_time": {"ar": "{} س {} د", "en": "{}h {}m"},
+    "list_separator": {"ar": "، ", "en": ", "},
 }
 
-MAJOR_CITIES = {
+# Built-in catalogs; other languages are JSON catalogs in locales/ (see i18n.py)
+LANGUAGE_NAMES = {"ar": "العربية", "en": "English"}
+DEFAULT_LANG = "ar"
+
+# Offered as buttons, by gazetteer spelling; catalogs may list their own and translate the labels
+MAJOR_CITIES = [
+    "Makkah", "Madinah", "Riyadh", "Jeddah", "Cairo", "Alexandria", "Giza", "Mansoura",
+    "Istanbul", "Ankara", "Izmir", "Bursa", "Dubai", "Abu Dhabi", "Sharjah",
+]
+
+CITY_NAMES = {
+    "ar": {
+        "Makkah": "مكة المكرمة", "Madinah": "المدينة المنورة", "Riyadh": "الرياض", "Jeddah": "جدة",
+        "Cairo": "القاهرة", "Alexandria": "الإسكندرية", "Giza": "الجيزة", "Mansoura": "المنصورة",
+        "Istanbul": "إسطنبول", "Ankara": "أنقرة", "Izmir": "إزمير", "Bursa": "بورصة",
+        "Dubai": "دبي", "Abu Dhabi": "أبوظبي", "Sharjah": "الشارقة",
+    },
+}
+
+PRAYER_NAMES = {
+    "ar": {"Fajr": "الفجر", "Dhuhr": "الظهر", "Asr": "العصر", "Maghrib": "المغرب", "Isha": "العشاء"},
+    "en": {"Fajr": "Fajr", "Dhuhr": "Dhuhr", "Asr": "Asr", "Maghrib": "Maghrib", "Isha": "Isha"},
+}
+
+HIJRI_MONTHS = {
     "ar": [
-        "مكة المكرمة",
-        "المدينة المنورة",
-        "الرياض",
-        "جدة",
-        "القاهرة",
-        "الإسكندرية",
-        "الجيزة",
-        "المنصورة",
-        "إسطنبول",
-        "أنقرة",
-        "إزمير",
-        "بورصة",
-        "دبي",
-        "أبوظبي",
-        "الشارقة",
+        "محرم", "صفر", "ربيع الأول", "ربيع الآخر", "جمادى الأولى", "جمادى الآخرة",
+        "رجب", "شعبان", "رمضان", "شوال", "ذو القعدة", "ذو الحجة",
     ],
     "en": [
-        "Makkah",
-        "Madinah",
-        "Riyadh",
-        "Jeddah",
-        "Cairo",
-        "Alexandria",
-        "Giza",
-        "Mansoura",
-        "Istanbul",
-        "Ankara",
-        "Izmir",
-        "Bursa",
-        "Dubai",
-        "Abu Dhabi",
-        "Sharjah",
+        "Muharram", "Safar", "Rabi' al-Awwal", "Rabi' al-Thani", "Jumada al-Ula", "Jumada al-Akhirah",
+        "Rajab", "Sha'ban", "Ramadan", "Shawwal", "Dhu al-Qi'dah", "Dhu al-Hijjah",
     ],
 }
 
+WEEKDAYS = {
+    "ar": ["الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"],
+    "en": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"],
+}
+
+# Aladhan calculation methods offered in the settings menu
+CALC_METHODS = {
+    5: {"ar": "الهيئة المصرية العامة للمساحة", "en": "Egyptian General Authority"},
+    4: {"ar": "أم القرى (مكة)", "en": "Umm Al-Qura, Makkah"},
+    3: {"ar": "رابطة العالم الإسلامي", "en": "Muslim World League"},
+    8: {"ar": "منطقة الخليج", "en": "Gulf Region"},
+    9: {"ar": "الكويت", "en": "Kuwait"},
+    10: {"ar": "قطر", "en": "Qatar"},
+    13: {"ar": "رئاسة الشؤون الدينية التركية", "en": "Diyanet, Turkey"},
+    1: {"ar": "جامعة العلوم الإسلامية، كراتشي", "en": "University of Islamic Sciences, Karachi"},
+    2: {"ar": "أمريكا الشمالية (ISNA)", "en": "ISNA, North America"},
+}
+DEFAULT_METHOD = 5
+DEFAULT_SCHOOL = 0  # 0 = Shafi'i (standard), 1 = Hanafi
+
+# Per-user prayer selection is a bitmask over PRAYERS (bit 0 = Fajr)
+PRAYERS = ("Fajr", "Dhuhr", "Asr", "Maghrib", "Isha")
+ALL_PRAYERS = (1 << len(PRAYERS)) - 1
+# Quiet-hour windows offered in settings as (start, end) local hours; stored as 24-bit hour masks
+QUIET_WINDOWS = [None, (9, 17), (22, 6)]
+
 
 TYPING_CITY = 1
\ No newline at end of file
@@ -0,0 +1,201 @@
+"""
+PID file and unix control socket used for supervised, zero-downtime restarts.
+
+Every bot process listens on ``bot.<pid>.sock`` and answers one
+line-based command per connection:
+
+    ping              -> "ok <pid> <active|standby>"
+    status            -> JSON with subscription stats
+    profile <seconds> -> path of a sampling/allocation profile report
+    handoff           -> stop polling and the scheduler, reply with the
+                         scheduler state as JSON, then drain and exit
+    takeover <json>   -> (standby only) import the state, start polling and
+                         reply once updates are being handled
+    stop              -> graceful shutdown
+
+The active instance owns ``bot.pid``; manage_bot.py reads it instead of
+matching process names.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+
+log = logging.getLogger(__name__)
+
+PID_FILE = "bot.pid"
+# A takeover line carries the scheduler state (~70 bytes per live parameter tuple),
+# far past asyncio's default 64 KiB line limit on big deployments
+LINE_LIMIT = 64 * 1024 * 1024
+
+
+def socket_path(pid: int) -> str:
+    return f"bot.{pid}.sock"
+
+
+def _runs_bot(argv: list) -> bool:
+    """Whether a command line is a python interpreter running bot.py (python3 -u bot.py, ...)"""
+    if not argv or not os.path.basename(argv[0]).startswith("python"):
+        return False
+    args = iter(argv[1:])
+    for arg in args:
+        if arg in ("-X", "-W"):
+            next(args, None)   # option value
+        elif not arg.startswith("-"):
+            return os.path.basename(arg) == "bot.py"
+        elif arg in ("-c", "-m") or arg.startswith(("-c", "-m")):
+            return False       # a command or module, not a script
+    return False
+
+
+def write_pid_file():
+    with open(PID_FILE, "w") as f:
+        f.write(str(os.getpid()))
+
+
+def read_pid_file():
+    """PID of the active bot, or None if the file is missing or stale"""
+    try:
+        with open(PID_FILE) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    # Guard against PID reuse by an unrelated process (including manage_bot.py or an editor on bot.py)
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            argv = f.read().decode(errors="replace").split("\0")
+        if not _runs_bot([arg for arg in argv if arg]):
+            return None
+    except OSError:
+        pass
+    return pid
+
+
+def remove_pid_file():
+    """Remove the PID file if it still belongs to this process"""
+    if read_pid_file() == os.getpid():
+        try:
+            os.remove(PID_FILE)
+        except OSError:
+            pass
+
+
+def send_command(pid: int, command: str, timeout: float = 30.0) -> str:
+    """Send one command to a bot's control socket and return its reply"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path(pid))
+        client.sendall(command.encode() + b"\n")
+        chunks = []
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b"".join(chunks).decode().strip()
+
+
+class ControlServer:
+    def __init__(self, app, standby: bool = False):
+        self.app = app
+        self.standby = standby
+        self.path = socket_path(os.getpid())
+        self.takeover = asyncio.Event()
+        self.started = asyncio.Event()   # set once a standby polls and handles updates after takeover
+        self.stopped = asyncio.Event()
+        self.commands = {
+            "ping": self._ping,
+            "status": self._status,
+            "handoff": self._handoff,
+            "takeover": self._takeover,
+            "profile": self._profile,
+            "stop": self._stop,
+        }
+        self._server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path, limit=LINE_LIMIT)
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    async def _handle(self, reader, writer):
+        try:
+            line = (await reader.readline()).decode().strip()
+            command, _, arg = line.partition(" ")
+            handler = self.commands.get(command)
+            reply = await handler(arg) if handler else f"error unknown command {command!r}"
+            writer.write(reply.encode() + b"\n")
+            await writer.drain()
+        except Exception as e:
+            log.error("Control command failed: %s", e)
+        finally:
+            writer.close()
+
+    async def _ping(self, arg):
+        return f"ok {os.getpid()} {'standby' if self.standby else 'active'}"
+
+    async def _status(self, arg):
+        from subscriptions import index_for
+        return json.dumps(index_for(self.app).stats())
+
+    async def _handoff(self, arg):
+        """Release polling and the scheduler to a standby instance"""
+        from subscriptions import index_for
+        if self.app.updater.running:
+            await self.app.updater.stop()
+        # Stop firing new jobs; ones already running finish during drain
+        self.app.job_queue.scheduler.pause()
+        # Make sure the standby loads everything this process knows
+        await self.app.update_persistence()
+        if self.app.persistence:
+            await self.app.persistence.flush()
+            # The standby loads the file now; nothing this process does while draining may overwrite it
+            # (shutdown would otherwise write the stale bot_data back)
+            self.app.persistence = None
+        state = json.dumps({"fired": index_for(self.app).export_fired()})
+        log.info("🔁 Handed off polling; draining and exiting")
+        self.stopped.set()
+        return state
+
+    async def _takeover(self, arg):
+        if not self.standby:
+            return "error not in standby"
+        from subscriptions import index_for
+        if arg:
+            index_for(self.app).import_fired(json.loads(arg).get("fired", []))
+        self.standby = False
+        self.takeover.set()
+        # Reply only once this process polls and handles updates, so the caller measures the real gap
+        waiters = [asyncio.ensure_future(self.started.wait()), asyncio.ensure_future(self.stopped.wait())]
+        await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in waiters:
+            waiter.cancel()
+        return "ok" if self.started.is_set() else "error takeover failed"
+
+    async def _profile(self, arg):
+        """Profile the live loop and reply with the path of the report file"""
+        import profiler
+        report = await profiler.run_profile(float(arg or 10))
+        path = os.path.abspath(f"profile-{os.getpid()}-{int(time.time())}.txt")
+        with open(path, "w") as f:
+            f.write(report)
+        return path
+
+    async def _stop(self, arg):
+        self.stopped.set()
+        return "ok"
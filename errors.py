@@ -0,0 +1,98 @@
+"""
+Error-storm aggregation for the update error handler.
+
+Errors are fingerprinted by exception type and the innermost frame in this
+project's code. The first occurrence of a fingerprint is logged in full;
+repeats within a window are only counted and summarised once per window with
+a few sample chat ids. Replies to users are throttled per chat.
+"""
+import logging
+import os
+import time
+import traceback
+import metrics
+
+log = logging.getLogger(__name__)
+
+SUMMARY_WINDOW = 60.0       # seconds between aggregated summaries
+REPLY_COOLDOWN = 300.0      # at most one error reply per chat in this period
+MAX_SAMPLES = 5
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def fingerprint(error: BaseException) -> str:
+    """Identify an error by its type and the site that raised it"""
+    frames = traceback.extract_tb(error.__traceback__) if error.__traceback__ else []
+    site = None
+    for frame in reversed(frames):
+        if os.path.abspath(frame.filename).startswith(_PROJECT_DIR):
+            site = frame
+            break
+    if site is None and frames:
+        site = frames[-1]
+    where = f"{os.path.basename(site.filename)}:{site.lineno}:{site.name}" if site else "unknown"
+    return f"{type(error).__name__}@{where}"
+
+
+class ErrorAggregator:
+    def __init__(self, window: float = SUMMARY_WINDOW, reply_cooldown: float = REPLY_COOLDOWN):
+        self.window = window
+        self.reply_cooldown = reply_cooldown
+        self.seen = set()
+        self.pending = {}        # fingerprint -> [count, sample chat ids]
+        self.last_reply = {}     # chat id -> monotonic time of last error reply
+        self.window_started = time.monotonic()
+
+    def record(self, error: BaseException, chat_id=None) -> bool:
+        """Count an error; returns True the first time its fingerprint is seen"""
+        fp = fingerprint(error)
+        metrics.inc("errors_total", fingerprint=fp)
+
+        is_new = fp not in self.seen
+        if is_new:
+            self.seen.add(fp)
+            metrics.inc("error_fingerprints_new")
+            metrics.set_gauge("error_fingerprint_first_seen", time.time(), fingerprint=fp)
+        else:
+            count, samples = self.pending.setdefault(fp, [0, []])
+            self.pending[fp][0] = count + 1
+            if chat_id is not None and len(samples) < MAX_SAMPLES and chat_id not in samples:
+                samples.append(chat_id)
+
+        if time.monotonic() - self.window_started >= self.window:
+            self.flush()
+        return is_new
+
+    def flush(self):
+        """Log one summary line per fingerprint that repeated in this window"""
+        for fp, (count, samples) in self.pending.items():
+            log.warning(
+                "❌ %s repeated %d times in the last %ds (sample chats: %s)",
+                fp, count, int(self.window), samples,
+                extra={"fingerprint": fp, "count": count},
+            )
+        self.pending = {}
+        self.window_started = time.monotonic()
+
+    def should_reply(self, chat_id) -> bool:
+        """Whether this chat may be told about an error now"""
+        now = time.monotonic()
+        last = self.last_reply.get(chat_id)
+        if last is not None and now - last < self.reply_cooldown:
+            metrics.inc("error_replies_throttled")
+            return False
+        self.last_reply[chat_id] = now
+        if len(self.last_reply) > 10000:
+            self.last_reply = {
+                chat: ts for chat, ts in self.last_reply.items() if now - ts < self.reply_cooldown
+            }
+        return True
+
+
+aggregator = ErrorAggregator()
+
+
+async def flush_error_summary(ctx):
+    """Job callback so quiet periods after a storm still get their summary"""
+    aggregator.flush()
@@ -0,0 +1,86 @@
+"""
+In-process stand-in for the Telegram Bot API, used by the offline tools
+"""
+import asyncio
+import json
+from collections import Counter
+from telegram.request import BaseRequest
+import clock
+
+BOT_USER = {
+    "id": 1000000,
+    "is_bot": True,
+    "first_name": "Azan Time Bot",
+    "username": "azan_time_bot",
+}
+
+
+class FakeRequest(BaseRequest):
+    """Answers every Bot API call locally and counts them per method"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.sent = []
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _message(self, params: dict) -> dict:
+        self._message_id += 1
+        chat_id = params.get("chat_id", 0)
+        return {
+            "message_id": params.get("message_id", self._message_id),
+            "date": int(clock.now().timestamp()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    async def do_request(
+        self,
+        url,
+        method,
+        request_data=None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ):
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[api_method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method in ("sendMessage", "editMessageText", "sendDocument", "sendPhoto"):
+            result = self._message(params)
+            file_id = f"file-{self._message_id}"
+            if api_method == "sendDocument":
+                result["document"] = {"file_id": file_id, "file_unique_id": file_id}
+            elif api_method == "sendPhoto":
+                result["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 1, "height": 1}]
+            self.sent.append((api_method, params.get("chat_id"), params.get("text"), clock.now().timestamp()))
+        elif api_method == "getWebhookInfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        elif api_method == "getUpdates":
+            result = []
+        else:
+            result = True
+
+        return 200, json.dumps({"ok": True, "result": result}).encode()
@@ -0,0 +1,329 @@
+"""
+Local gazetteer and nearest-city lookup for shared locations.
+
+Coordinates are snapped to the nearest canonical city so that every user in
+and around a city shares one (city, country) key, and with it one cached
+timetable and one notification job. Cities are indexed in a small KD-tree
+over unit vectors on the sphere, where straight-line (chord) distance orders
+points the same way as great-circle distance.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0
+FAR_CITY_KM = 100         # beyond this, suggest typing a closer city by name
+
+# (city, country, latitude, longitude)
+CITIES = [
+    # Saudi Arabia
+    ("Makkah", "Saudi Arabia", 21.4225, 39.8262),
+    ("Madinah", "Saudi Arabia", 24.4672, 39.6111),
+    ("Riyadh", "Saudi Arabia", 24.7136, 46.6753),
+    ("Jeddah", "Saudi Arabia", 21.4858, 39.1925),
+    ("Dammam", "Saudi Arabia", 26.4207, 50.0888),
+    ("Taif", "Saudi Arabia", 21.2703, 40.4158),
+    ("Tabuk", "Saudi Arabia", 28.3835, 36.5662),
+    ("Buraidah", "Saudi Arabia", 26.3592, 43.9818),
+    ("Abha", "Saudi Arabia", 18.2164, 42.5053),
+    ("Hail", "Saudi Arabia", 27.5114, 41.7208),
+    ("Jazan", "Saudi Arabia", 16.8892, 42.5511),
+    ("Najran", "Saudi Arabia", 17.5656, 44.2289),
+    ("Al Hofuf", "Saudi Arabia", 25.3839, 49.5869),
+    ("Yanbu", "Saudi Arabia", 24.0895, 38.0618),
+    # Egypt
+    ("Cairo", "Egypt", 30.0444, 31.2357),
+    ("Alexandria", "Egypt", 31.2001, 29.9187),
+    ("Giza", "Egypt", 30.0131, 31.2089),
+    ("Mansoura", "Egypt", 31.0409, 31.3785),
+    ("Tanta", "Egypt", 30.7865, 31.0004),
+    ("Zagazig", "Egypt", 30.5877, 31.5020),
+    ("Port Said", "Egypt", 31.2653, 32.3019),
+    ("Suez", "Egypt", 29.9668, 32.5498),
+    ("Ismailia", "Egypt", 30.5965, 32.2715),
+    ("Damanhur", "Egypt", 31.0341, 30.4682),
+    ("Faiyum", "Egypt", 29.3084, 30.8428),
+    ("Beni Suef", "Egypt", 29.0661, 31.0994),
+    ("Minya", "Egypt", 28.1099, 30.7503),
+    ("Asyut", "Egypt", 27.1783, 31.1859),
+    ("Sohag", "Egypt", 26.5591, 31.6957),
+    ("Qena", "Egypt", 26.1551, 32.7160),
+    ("Luxor", "Egypt", 25.6872, 32.6396),
+    ("Aswan", "Egypt", 24.0889, 32.8998),
+    ("Hurghada", "Egypt", 27.2579, 33.8116),
+    ("Marsa Matruh", "Egypt", 31.3543, 27.2373),
+    ("Arish", "Egypt", 31.1316, 33.7984),
+    # Turkey
+    ("Istanbul", "Turkey", 41.0082, 28.9784),
+    ("Ankara", "Turkey", 39.9334, 32.8597),
+    ("Izmir", "Turkey", 38.4237, 27.1428),
+    ("Bursa", "Turkey", 40.1885, 29.0610),
+    ("Antalya", "Turkey", 36.8969, 30.7133),
+    ("Konya", "Turkey", 37.8746, 32.4932),
+    ("Adana", "Turkey", 37.0000, 35.3213),
+    ("Gaziantep", "Turkey", 37.0662, 37.3833),
+    ("Kayseri", "Turkey", 38.7312, 35.4787),
+    ("Trabzon", "Turkey", 41.0027, 39.7168),
+    ("Diyarbakir", "Turkey", 37.9144, 40.2306),
+    ("Erzurum", "Turkey", 39.9043, 41.2679),
+    ("Samsun", "Turkey", 41.2867, 36.3300),
+    ("Eskisehir", "Turkey", 39.7767, 30.5206),
+    ("Van", "Turkey", 38.5012, 43.3730),
+    # Gulf
+    ("Dubai", "UAE", 25.2048, 55.2708),
+    ("Abu Dhabi", "UAE", 24.4539, 54.3773),
+    ("Sharjah", "UAE", 25.3463, 55.4209),
+    ("Al Ain", "UAE", 24.1302, 55.8023),
+    ("Ras Al Khaimah", "UAE", 25.8007, 55.9762),
+    ("Fujairah", "UAE", 25.1288, 56.3265),
+    ("Doha", "Qatar", 25.2854, 51.5310),
+    ("Kuwait", "Kuwait", 29.3759, 47.9774),
+    ("Manama", "Bahrain", 26.2285, 50.5860),
+    ("Muscat", "Oman", 23.5880, 58.3829),
+    ("Salalah", "Oman", 17.0151, 54.0924),
+    ("Sohar", "Oman", 24.3470, 56.7094),
+    # Levant and Iraq
+    ("Amman", "Jordan", 31.9454, 35.9284),
+    ("Irbid", "Jordan", 32.5556, 35.8500),
+    ("Aqaba", "Jordan", 29.5321, 35.0063),
+    ("Jerusalem", "Palestine", 31.7683, 35.2137),
+    ("Gaza", "Palestine", 31.5017, 34.4668),
+    ("Nablus", "Palestine", 32.2211, 35.2544),
+    ("Hebron", "Palestine", 31.5326, 35.0998),
+    ("Beirut", "Lebanon", 33.8938, 35.5018),
+    ("Tripoli", "Lebanon", 34.4367, 35.8497),
+    ("Damascus", "Syria", 33.5138, 36.2765),
+    ("Aleppo", "Syria", 36.2021, 37.1343),
+    ("Homs", "Syria", 34.7324, 36.7137),
+    ("Latakia", "Syria", 35.5317, 35.7901),
+    ("Baghdad", "Iraq", 33.3152, 44.3661),
+    ("Basra", "Iraq", 30.5085, 47.7804),
+    ("Mosul", "Iraq", 36.3350, 43.1189),
+    ("Erbil", "Iraq", 36.1911, 44.0092),
+    ("Najaf", "Iraq", 32.0000, 44.3300),
+    ("Karbala", "Iraq", 32.6160, 44.0249),
+    # Yemen
+    ("Sanaa", "Yemen", 15.3694, 44.1910),
+    ("Aden", "Yemen", 12.7855, 45.0187),
+    ("Taiz", "Yemen", 13.5795, 44.0209),
+    ("Mukalla", "Yemen", 14.5425, 49.1242),
+    # North Africa
+    ("Khartoum", "Sudan", 15.5007, 32.5599),
+    ("Port Sudan", "Sudan", 19.6158, 37.2164),
+    ("Tripoli", "Libya", 32.8872, 13.1913),
+    ("Benghazi", "Libya", 32.1167, 20.0667),
+    ("Tunis", "Tunisia", 36.8065, 10.1815),
+    ("Sfax", "Tunisia", 34.7406, 10.7603),
+    ("Algiers", "Algeria", 36.7538, 3.0588),
+    ("Oran", "Algeria", 35.6971, -0.6308),
+    ("Constantine", "Algeria", 36.3650, 6.6147),
+    ("Rabat", "Morocco", 34.0209, -6.8416),
+    ("Casablanca", "Morocco", 33.5731, -7.5898),
+    ("Marrakesh", "Morocco", 31.6295, -7.9811),
+    ("Fes", "Morocco", 34.0181, -5.0078),
+    ("Tangier", "Morocco", 35.7595, -5.8340),
+    ("Agadir", "Morocco", 30.4278, -9.5981),
+    ("Nouakchott", "Mauritania", 18.0735, -15.9582),
+    # Sub-Saharan Africa
+    ("Mogadishu", "Somalia", 2.0469, 45.3182),
+    ("Djibouti", "Djibouti", 11.5721, 43.1456),
+    ("Addis Ababa", "Ethiopia", 9.0300, 38.7400),
+    ("Nairobi", "Kenya", -1.2921, 36.8219),
+    ("Mombasa", "Kenya", -4.0435, 39.6682),
+    ("Dar es Salaam", "Tanzania", -6.7924, 39.2083),
+    ("Kano", "Nigeria", 12.0022, 8.5920),
+    ("Lagos", "Nigeria", 6.5244, 3.3792),
+    ("Abuja", "Nigeria", 9.0765, 7.3986),
+    ("Dakar", "Senegal", 14.7167, -17.4677),
+    ("Bamako", "Mali", 12.6392, -8.0029),
+    ("Niamey", "Niger", 13.5116, 2.1254),
+    ("N'Djamena", "Chad", 12.1348, 15.0557),
+    ("Accra", "Ghana", 5.6037, -0.1870),
+    ("Johannesburg", "South Africa", -26.2041, 28.0473),
+    ("Cape Town", "South Africa", -33.9249, 18.4241),
+    # Iran, Central and South Asia
+    ("Tehran", "Iran", 35.6892, 51.3890),
+    ("Mashhad", "Iran", 36.2605, 59.6168),
+    ("Isfahan", "Iran", 32.6546, 51.6680),
+    ("Tabriz", "Iran", 38.0800, 46.2919),
+    ("Shiraz", "Iran", 29.5918, 52.5837),
+    ("Kabul", "Afghanistan", 34.5553, 69.2075),
+    ("Herat", "Afghanistan", 34.3529, 62.2040),
+    ("Tashkent", "Uzbekistan", 41.2995, 69.2401),
+    ("Samarkand", "Uzbekistan", 39.6270, 66.9750),
+    ("Almaty", "Kazakhstan", 43.2220, 76.8512),
+    ("Astana", "Kazakhstan", 51.1694, 71.4491),
+    ("Bishkek", "Kyrgyzstan", 42.8746, 74.5698),
+    ("Dushanbe", "Tajikistan", 38.5598, 68.7870),
+    ("Ashgabat", "Turkmenistan", 37.9601, 58.3261),
+    ("Baku", "Azerbaijan", 40.4093, 49.8671),
+    ("Karachi", "Pakistan", 24.8607, 67.0011),
+    ("Lahore", "Pakistan", 31.5204, 74.3587),
+    ("Islamabad", "Pakistan", 33.6844, 73.0479),
+    ("Peshawar", "Pakistan", 34.0151, 71.5249),
+    ("Quetta", "Pakistan", 30.1798, 66.9750),
+    ("Faisalabad", "Pakistan", 31.4504, 73.1350),
+    ("Multan", "Pakistan", 30.1575, 71.5249),
+    ("Delhi", "India", 28.7041, 77.1025),
+    ("Mumbai", "India", 19.0760, 72.8777),
+    ("Hyderabad", "India", 17.3850, 78.4867),
+    ("Kolkata", "India", 22.5726, 88.3639),
+    ("Chennai", "India", 13.0827, 80.2707),
+    ("Bangalore", "India", 12.9716, 77.5946),
+    ("Lucknow", "India", 26.8467, 80.9462),
+    ("Srinagar", "India", 34.0837, 74.7973),
+    ("Dhaka", "Bangladesh", 23.8103, 90.4125),
+    ("Chittagong", "Bangladesh", 22.3569, 91.7832),
+    ("Colombo", "Sri Lanka", 6.9271, 79.8612),
+    ("Male", "Maldives", 4.1755, 73.5093),
+    # Southeast and East Asia
+    ("Jakarta", "Indonesia", -6.2088, 106.8456),
+    ("Surabaya", "Indonesia", -7.2575, 112.7521),
+    ("Bandung", "Indonesia", -6.9175, 107.6191),
+    ("Medan", "Indonesia", 3.5952, 98.6722),
+    ("Makassar", "Indonesia", -5.1477, 119.4327),
+    ("Banda Aceh", "Indonesia", 5.5483, 95.3238),
+    ("Kuala Lumpur", "Malaysia", 3.1390, 101.6869),
+    ("George Town", "Malaysia", 5.4141, 100.3288),
+    ("Kota Kinabalu", "Malaysia", 5.9804, 116.0735),
+    ("Singapore", "Singapore", 1.3521, 103.8198),
+    ("Bandar Seri Begawan", "Brunei", 4.9031, 114.9398),
+    ("Bangkok", "Thailand", 13.7563, 100.5018),
+    ("Manila", "Philippines", 14.5995, 120.9842),
+    ("Cotabato", "Philippines", 7.2236, 124.2464),
+    ("Beijing", "China", 39.9042, 116.4074),
+    ("Urumqi", "China", 43.8256, 87.6168),
+    ("Tokyo", "Japan", 35.6762, 139.6503),
+    ("Seoul", "South Korea", 37.5665, 126.9780),
+    # Europe
+    ("London", "United Kingdom", 51.5074, -0.1278),
+    ("Birmingham", "United Kingdom", 52.4862, -1.8904),
+    ("Manchester", "United Kingdom", 53.4808, -2.2426),
+    ("Paris", "France", 48.8566, 2.3522),
+    ("Marseille", "France", 43.2965, 5.3698),
+    ("Lyon", "France", 45.7640, 4.8357),
+    ("Berlin", "Germany", 52.5200, 13.4050),
+    ("Hamburg", "Germany", 53.5511, 9.9937),
+    ("Frankfurt", "Germany", 50.1109, 8.6821),
+    ("Cologne", "Germany", 50.9375, 6.9603),
+    ("Munich", "Germany", 48.1351, 11.5820),
+    ("Amsterdam", "Netherlands", 52.3676, 4.9041),
+    ("Rotterdam", "Netherlands", 51.9244, 4.4777),
+    ("Brussels", "Belgium", 50.8503, 4.3517),
+    ("Vienna", "Austria", 48.2082, 16.3738),
+    ("Zurich", "Switzerland", 47.3769, 8.5417),
+    ("Rome", "Italy", 41.9028, 12.4964),
+    ("Milan", "Italy", 45.4642, 9.1900),
+    ("Madrid", "Spain", 40.4168, -3.7038),
+    ("Barcelona", "Spain", 41.3874, 2.1686),
+    ("Lisbon", "Portugal", 38.7223, -9.1393),
+    ("Stockholm", "Sweden", 59.3293, 18.0686),
+    ("Oslo", "Norway", 59.9139, 10.7522),
+    ("Copenhagen", "Denmark", 55.6761, 12.5683),
+    ("Helsinki", "Finland", 60.1699, 24.9384),
+    ("Dublin", "Ireland", 53.3498, -6.2603),
+    ("Athens", "Greece", 37.9838, 23.7275),
+    ("Sarajevo", "Bosnia and Herzegovina", 43.8563, 18.4131),
+    ("Tirana", "Albania", 41.3275, 19.8187),
+    ("Pristina", "Kosovo", 42.6629, 21.1655),
+    ("Skopje", "North Macedonia", 41.9981, 21.4254),
+    ("Sofia", "Bulgaria", 42.6977, 23.3219),
+    ("Bucharest", "Romania", 44.4268, 26.1025),
+    ("Warsaw", "Poland", 52.2297, 21.0122),
+    ("Moscow", "Russia", 55.7558, 37.6173),
+    ("Kazan", "Russia", 55.7887, 49.1221),
+    ("Grozny", "Russia", 43.3180, 45.6987),
+    ("Makhachkala", "Russia", 42.9849, 47.5047),
+    ("Kyiv", "Ukraine", 50.4501, 30.5234),
+    ("Simferopol", "Ukraine", 44.9521, 34.1024),
+    # Americas and Oceania
+    ("New York", "United States", 40.7128, -74.0060),
+    ("Chicago", "United States", 41.8781, -87.6298),
+    ("Los Angeles", "United States", 34.0522, -118.2437),
+    ("Houston", "United States", 29.7604, -95.3698),
+    ("Dearborn", "United States", 42.3223, -83.1763),
+    ("Washington", "United States", 38.9072, -77.0369),
+    ("Toronto", "Canada", 43.6532, -79.3832),
+    ("Montreal", "Canada", 45.5017, -73.5673),
+    ("Vancouver", "Canada", 49.2827, -123.1207),
+    ("Mexico City", "Mexico", 19.4326, -99.1332),
+    ("Sao Paulo", "Brazil", -23.5505, -46.6333),
+    ("Buenos Aires", "Argentina", -34.6037, -58.3816),
+    ("Sydney", "Australia", -33.8688, 151.2093),
+    ("Melbourne", "Australia", -37.8136, 144.9631),
+    ("Auckland", "New Zealand", -36.8485, 174.7633),
+]
+
+
+def _unit_vector(lat: float, lon: float) -> tuple:
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _squared(a: tuple, b: tuple) -> float:
+    return (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2
+
+
+class KDTree:
+    """Static 3-d tree over (point, value) pairs with nearest-neighbour search"""
+
+    def __init__(self, items):
+        self._root = self._build(list(items), 0)
+
+    def _build(self, items, depth):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        return (items[mid], axis, self._build(items[:mid], depth + 1), self._build(items[mid + 1:], depth + 1))
+
+    def nearest(self, point: tuple):
+        """(value, squared distance) of the item closest to `point`"""
+        best = [None, math.inf]
+        stack = [(self._root, 0.0)]
+        while stack:
+            node, plane = stack.pop()
+            # Skip a subtree whose splitting plane is already farther than the best match
+            if node is None or plane >= best[1]:
+                continue
+            (item_point, value), axis, left, right = node
+            distance = _squared(point, item_point)
+            if distance < best[1]:
+                best[0], best[1] = value, distance
+            delta = point[axis] - item_point[axis]
+            near, far = (left, right) if delta < 0 else (right, left)
+            stack.append((far, delta * delta))
+            stack.append((near, 0.0))
+        return best[0], best[1]
+
+
+_tree = KDTree((_unit_vector(lat, lon), (city, country)) for city, country, lat, lon in CITIES)
+
+
+_by_name = {}
+for _city, _country, _lat, _lon in CITIES:
+    _by_name.setdefault(_city.casefold(), (_city, _country))
+
+
+def add_alias(name: str, city: str):
+    """Let another spelling (e.g. a translated button label) resolve to a gazetteer city"""
+    known = _by_name.get(city.casefold())
+    if known:
+        _by_name.setdefault(name.strip().casefold(), known)
+
+
+def canonical_city(name: str):
+    """(city, country) as spelled in the gazetteer for a typed name, or None if it is not listed"""
+    return _by_name.get(name.strip().casefold())
+
+
+def country_of(city: str):
+    """Country of a gazetteer city by name, or None if it is not listed"""
+    known = canonical_city(city)
+    return known[1] if known else None
+
+
+def nearest_city(lat: float, lon: float) -> tuple:
+    """(city, country, distance in km) of the gazetteer city closest to the coordinates"""
+    (city, country), squared = _tree.nearest(_unit_vector(lat, lon))
+    chord = math.sqrt(squared)
+    return city, country, 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
@@ -6,34 +6,47 @@ from telegram.ext import (
     CommandHandler,
     MessageHandler,
     filters,
-    ConversationHandler
+    ConversationHandler,
+    InlineQueryHandler
 )
-from config import TYPING_CITY, TEXTS, MAJOR_CITIES
-from utils import _, user_lang, today_str, format_timings, get_prayer_times
+from config import TYPING_CITY, DEFAULT_LANG, CALC_METHODS, PRAYERS, ALL_PRAYERS, QUIET_WINDOWS
+from utils import _, user_lang, today_str, format_timings, get_prayer_times, calc_params, hours_mask, city_name
 from keyboards import (
     settings_keyboard,
     main_menu_kb,
     city_selection_keyboard,
     language_keyboard,
+    method_keyboard,
+    prayers_keyboard,
+    quiet_window,
     after_city_selection_keyboard
 )
-from jobs import notify
+from subscriptions import index_for
+from errors import aggregator as error_aggregator
+from broadcast import broadcast_cmd
+from admin import profile_cmd, stats_cmd
+from subscriptions import params_key
+import ramadan
+from stats import stats_for
+from i18n import LOCALES
+from inline import inline_query, city_index
+from callbacks import CallbackRouter, pack
+from timetable import timetable_cmd
+from gazetteer import nearest_city, canonical_city, FAR_CITY_KM
 
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send welcome message and main menu"""
     lang = user_lang(context)
+    # A chat pruned after blocking the bot gets its alerts back once it talks to us again
+    if index_for(context.application).revive(update.effective_chat.id, context.user_data):
+        stats_for(context.application).inc("chats_revived")
     await update.message.reply_text(
         _("start", lang, today_str(lang)),
         parse_mode="Markdown",
         reply_markup=InlineKeyboardMarkup([
-            [InlineKeyboardButton(_("settings", lang), callback_data="settings")]
+            [InlineKeyboardButton(_("settings", lang), callback_data=pack("settings"))]
         ])
     )
 
@@ -60,7 +73,7 @@ async def city_selected(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle city selection from inline keyboard"""
     query = update.callback_query
     await query.answer()
-    city = query.data.removeprefix("city_")
+    city = context.args[0]
     await _save_city(update, context, city, "")
 
 async def enter_city(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -77,10 +90,25 @@ async def handle_city_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await _save_city(update, context, city, "")
     return ConversationHandler.END
 
+async def handle_location(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Snap a shared location to the nearest known city and save it"""
+    location = update.message.location
+    city, country, distance = nearest_city(location.latitude, location.longitude)
+    await _save_city(update, context, city, country)
+    if distance > FAR_CITY_KM and context.user_data.get("city") == city:
+        await update.message.reply_text(
+            _("nearest_city_far", user_lang(context), city_name(city, user_lang(context)), round(distance)),
+            parse_mode="Markdown"
+        )
+
 async def _save_city(update: Update, context: ContextTypes.DEFAULT_TYPE, city: str, country: str):
     """Save city and show prayer times"""
     lang = user_lang(context)
-    times = get_prayer_times(city, country)
+    if not country:
+        # Known cities are saved under their gazetteer spelling so they share one subscription key
+        city, country = canonical_city(city) or (city, country)
+    method, school = calc_params(context.user_data)
+    times = get_prayer_times(city, country, method=method, school=school)
     
     if not times:
         error_msg = _("error_fetch", lang) + f" ({city})"
@@ -98,20 +126,10 @@ async def _save_city(update: Update, context: ContextTypes.DEFAULT_TYPE, city: s
     context.user_data["city"] = city
     context.user_data["country"] = country
     context.user_data["muted"] = False
-    chat_id = update.effective_chat.id
-    for job in context.application.job_queue.get_jobs_by_name(str(chat_id)):
-        job.schedule_removal()
-    
-    context.job_queue.run_repeating(
-        notify,
-        interval=60,
-        first=10,
-        chat_id=chat_id,
-        name=str(chat_id),
-        data=(city, country)
-    )
+    index_for(context.application).subscribe(update.effective_chat.id, context.user_data)
+    city_index.add(city)
 
-    text = _("city_saved", lang, city, f" ({country})" if country else "", format_timings(times, lang))
+    text = _("city_saved", lang, city_name(city, lang), f" ({country})" if country else "", format_timings(times, lang))
     
     if update.callback_query:
         try:
@@ -146,7 +164,8 @@ async def show_today(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(_("no_city", lang))
         return
     
-    times = get_prayer_times(city, context.user_data.get("country", ""))
+    method, school = calc_params(context.user_data)
+    times = get_prayer_times(city, context.user_data.get("country", ""), method=method, school=school)
     if not times:
         error_msg = _("error_fetch", lang)
         if update.callback_query:
@@ -157,7 +176,10 @@ async def show_today(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Include city name in the message like _save_city does
     country_text = f" ({context.user_data.get('country', '')})" if context.user_data.get('country') else ""
-    message_text = _("city_saved", lang, city, country_text, format_timings(times, lang))
+    message_text = _("city_saved", lang, city_name(city, lang), country_text, format_timings(times, lang))
+    countdown = ramadan.countdown_text(params_key(context.user_data), lang)
+    if countdown:
+        message_text += "\n\n" + countdown
     keyboard = after_city_selection_keyboard(lang)
     
     if update.callback_query:
@@ -184,6 +206,19 @@ async def show_today(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=keyboard
         )
 
+def _iftar_alert(context: ContextTypes.DEFAULT_TYPE):
+    """Iftar alert state for the settings menu, or None outside Ramadan mode"""
+    if not ramadan.is_active():
+        return None
+    return context.user_data.get("iftar_alert", False)
+
+def _settings_markup(context: ContextTypes.DEFAULT_TYPE, lang: str):
+    data = context.user_data
+    return settings_keyboard(
+        lang, data.get("muted", False), *calc_params(data), iftar_alert=_iftar_alert(context),
+        prayers=data.get("prayers", ALL_PRAYERS), quiet=data.get("quiet", 0),
+    )
+
 async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show settings menu"""
     query = update.callback_query
@@ -191,17 +226,16 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer()
     
     lang = user_lang(context)
-    muted = context.user_data.get("muted", False)
     
     if query:
         await query.edit_message_text(
             _("settings", lang),
-            reply_markup=settings_keyboard(lang, muted)
+            reply_markup=_settings_markup(context, lang)
         )
     else:
         await update.message.reply_text(
             _("settings", lang),
-            reply_markup=settings_keyboard(lang, muted)
+            reply_markup=_settings_markup(context, lang)
         )
 
 async def open_settings_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -209,32 +243,23 @@ async def open_settings_text(update: Update, context: ContextTypes.DEFAULT_TYPE)
     await settings(update, context)
 
 async def toggle_lang(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Toggle between Arabic and English"""
+    """Open the language picker (the settings button once flipped between Arabic and English)"""
     query = update.callback_query
     await query.answer()
-    lang = "en" if user_lang(context) == "ar" else "ar"
-    context.user_data["lang"] = lang
-    
-    await query.edit_message_text(
-        _("settings", lang),
-        reply_markup=settings_keyboard(lang, context.user_data.get("muted", False))
-    )
-    
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=_("lang_changed", lang),
-        reply_markup=main_menu_kb(lang)
-    )
+    lang = user_lang(context)
+    await query.edit_message_text(_("choose_lang", lang), reply_markup=language_keyboard(lang))
 
 async def set_lang_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle language selection from inline keyboard"""
     query = update.callback_query
-    lang = query.data.removeprefix("set_lang_")
+    await query.answer()
+    lang = context.args[0] if context.args[0] in LOCALES else DEFAULT_LANG
     context.user_data["lang"] = lang
+    index_for(context.application).update_flags(update.effective_chat.id, context.user_data)
     
     await query.edit_message_text(
         _("settings", lang),
-        reply_markup=settings_keyboard(lang, context.user_data.get("muted", False))
+        reply_markup=_settings_markup(context, lang)
     )
     
     await context.bot.send_message(
@@ -248,6 +273,77 @@ async def toggle_mute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     context.user_data["muted"] = not context.user_data.get("muted", False)
+    index_for(context.application).update_flags(update.effective_chat.id, context.user_data)
+    await settings(update, context)
+
+async def choose_method(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show calculation method selection keyboard"""
+    query = update.callback_query
+    await query.answer()
+    lang = user_lang(context)
+    method, _school = calc_params(context.user_data)
+    await query.edit_message_text(
+        _("choose_method", lang),
+        reply_markup=method_keyboard(lang, method)
+    )
+
+def _resubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Move the chat to the key matching its new calculation parameters"""
+    if context.user_data.get("city"):
+        index_for(context.application).subscribe(update.effective_chat.id, context.user_data)
+
+async def set_method(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle calculation method selection"""
+    query = update.callback_query
+    await query.answer()
+    method = int(context.args[0])
+    if method in CALC_METHODS:
+        context.user_data["method"] = method
+        _resubscribe(update, context)
+    await settings(update, context)
+
+async def toggle_school(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Toggle Asr juristic school between Shafi'i and Hanafi"""
+    query = update.callback_query
+    await query.answer()
+    _method, school = calc_params(context.user_data)
+    context.user_data["school"] = 1 - school
+    _resubscribe(update, context)
+    await settings(update, context)
+
+async def toggle_iftar_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Toggle the Ramadan iftar alert"""
+    query = update.callback_query
+    await query.answer()
+    context.user_data["iftar_alert"] = not context.user_data.get("iftar_alert", False)
+    index_for(context.application).update_flags(update.effective_chat.id, context.user_data)
+    await settings(update, context)
+
+async def choose_prayers(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the per-prayer alert toggles"""
+    query = update.callback_query
+    await query.answer()
+    lang = user_lang(context)
+    await query.edit_message_text(
+        _("choose_prayers", lang),
+        reply_markup=prayers_keyboard(lang, context.user_data.get("prayers", ALL_PRAYERS))
+    )
+
+async def toggle_prayer(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Flip one prayer's bit in the user's alert mask"""
+    bit = int(context.args[0])
+    if 0 <= bit < len(PRAYERS):
+        context.user_data["prayers"] = context.user_data.get("prayers", ALL_PRAYERS) ^ (1 << bit)
+        index_for(context.application).update_flags(update.effective_chat.id, context.user_data)
+    await choose_prayers(update, context)
+
+async def cycle_quiet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Step through the quiet-hour presets"""
+    query = update.callback_query
+    await query.answer()
+    current = QUIET_WINDOWS.index(quiet_window(context.user_data.get("quiet", 0)))
+    context.user_data["quiet"] = hours_mask(QUIET_WINDOWS[(current + 1) % len(QUIET_WINDOWS)])
+    index_for(context.application).update_flags(update.effective_chat.id, context.user_data)
     await settings(update, context)
 
 async def close(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -273,25 +369,23 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors that occur during update processing"""
-    import traceback
-    
-    # Log detailed error information
-    logger.error(f"❌ EXCEPTION CAUGHT: {context.error}")
-    logger.error(f"❌ EXCEPTION TYPE: {type(context.error)}")
-    logger.error(f"❌ TRACEBACK: {traceback.format_exc()}")
-    
-    if update:
-        logger.error(f"❌ UPDATE INFO: {update}")
-        if update.message:
-            logger.error(f"❌ MESSAGE: {update.message.text}")
-        if update.callback_query:
-            logger.error(f"❌ CALLBACK: {update.callback_query.data}")
+    chat_id = update.effective_chat.id if isinstance(update, Update) and update.effective_chat else None
+
+    # Log each distinct error once in full; repeats are summarised by the aggregator
+    if error_aggregator.record(context.error, chat_id):
+        details = ""
+        if isinstance(update, Update):
+            if update.message:
+                details = f"message={update.message.text!r}"
+            elif update.callback_query:
+                details = f"callback={update.callback_query.data!r}"
+        logger.error("❌ EXCEPTION CAUGHT: %r %s", context.error, details, exc_info=context.error)
     
-    # Try to inform the user about the error
+    # Try to inform the user about the error, at most once per cooldown per chat
     try:
-        if update and update.effective_chat:
+        if chat_id is not None and error_aggregator.should_reply(chat_id):
             lang = user_lang(context) if context.user_data else "ar"
-            error_msg = _("error_fetch", lang) if "error_fetch" in TEXTS else "❌ حدث خطأ / An error occurred"
+            error_msg = _("error_fetch", lang)
             
             if update.callback_query:
                 try:
@@ -305,13 +399,33 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 except:
                     pass
     except Exception as e:
-        logger.error(f"Error in error handler: {e}")
+        logger.error("Error in error handler: %s", e)
+
+def callback_router() -> CallbackRouter:
+    """One handler for every inline button, dispatched by callback_data prefix"""
+    return CallbackRouter({
+        "settings": settings,
+        "close": close,
+        "refresh": refresh,
+        "choose_city": choose_city,
+        "city": city_selected,
+        "toggle_mute": toggle_mute,
+        "toggle_lang": toggle_lang,
+        "set_lang": set_lang_callback,
+        "choose_method": choose_method,
+        "method": set_method,
+        "toggle_school": toggle_school,
+        "toggle_iftar": toggle_iftar_alert,
+        "choose_prayers": choose_prayers,
+        "toggle_prayer": toggle_prayer,
+        "cycle_quiet": cycle_quiet,
+    })
 
 def setup_handlers(application):
     """Set up all handlers for the bot"""
     
     conv_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(enter_city, pattern="enter_city")],
+        entry_points=[CallbackQueryHandler(enter_city, pattern=f"^({pack('enter_city')}|enter_city)$")],
         states={
             TYPING_CITY: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_city_text),
@@ -324,20 +438,20 @@ def setup_handlers(application):
     application.add_handler(CommandHandler("lang", lang_cmd))
     application.add_handler(CommandHandler("today", show_today))
     application.add_handler(CommandHandler("settings", open_settings_text))
+    application.add_handler(CommandHandler("broadcast", broadcast_cmd))
+    # Runs beside other updates: the profile has to see handlers working, not a stalled queue
+    application.add_handler(CommandHandler("profile", profile_cmd, block=False))
+    application.add_handler(CommandHandler("stats", stats_cmd))
+    application.add_handler(CommandHandler("timetable", timetable_cmd))
     
     application.add_handler(MessageHandler(filters.Regex("^📅"), show_today))
     application.add_handler(MessageHandler(filters.Regex("^⚙️"), open_settings_text))
-    
-    application.add_handler(CallbackQueryHandler(toggle_mute, pattern="toggle_mute"))
-    application.add_handler(CallbackQueryHandler(toggle_lang, pattern="toggle_lang"))
-    application.add_handler(CallbackQueryHandler(set_lang_callback, pattern=r"^set_lang_"))
-    application.add_handler(CallbackQueryHandler(city_selected, pattern=r"^city_.*"))
-    application.add_handler(CallbackQueryHandler(close, pattern="close"))
-    application.add_handler(CallbackQueryHandler(refresh, pattern="refresh"))
-    application.add_handler(CallbackQueryHandler(choose_city, pattern="choose_city"))
-    application.add_handler(CallbackQueryHandler(settings, pattern="settings"))
+    # Live locations also arrive as edited_message updates, which carry no update.message
+    application.add_handler(MessageHandler(filters.LOCATION & filters.UpdateType.MESSAGE, handle_location))
     
     application.add_handler(conv_handler)
+    application.add_handler(callback_router())
+    application.add_handler(InlineQueryHandler(inline_query))
     
     # Add error handler
     application.add_error_handler(error_handler)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Locale catalogs, compiled once at import.
+
+Arabic and English are built into config.py; every other language is a JSON
+catalog in locales/ (tr.json, ur.json, ...). Each one is flattened into
+{key: template} and checked against English: a missing key, or a template
+whose placeholders differ from the English one, is logged and filled from
+English, and a key the code asks for that English lacks fails the import.
+So a lookup never raises at runtime, and text without placeholders is stored
+ready to send rather than formatted on every call.
+"""
+import json
+import logging
+import os
+import re
+import string
+from collections import namedtuple
+from config import (
+    TEXTS, LANGUAGE_NAMES, DEFAULT_LANG, MAJOR_CITIES, CITY_NAMES, PRAYER_NAMES, HIJRI_MONTHS, WEEKDAYS,
+    CALC_METHODS, PRAYERS,
+)
+from gazetteer import canonical_city, add_alias
+
+log = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LOCALES_DIR = os.path.join(HERE, "locales")
+REFERENCE_LANG = "en"
+TIMINGS_ICONS = ("🌅", "☀️", "🌇", "🌆", "🌙")
+
+# templates: {key: (text, None)} for static text, {key: (template, template.format)} otherwise
+# cities: [(gazetteer name used in callbacks, label shown on the button)]; city_names: {gazetteer name: label}
+Locale = namedtuple("Locale", "code name templates prayers hijri_months weekdays methods cities city_names")
+
+
+def _fields(template: str) -> frozenset:
+    """Placeholders of a template, with automatic ones numbered as str.format would"""
+    fields, auto = set(), 0
+    for _literal, field, _spec, _conversion in string.Formatter().parse(template):
+        if field is None:
+            continue
+        name = re.split(r"[.\[]", field, 1)[0]
+        if not name:
+            name, auto = str(auto), auto + 1
+        fields.add(name)
+    return frozenset(fields)
+
+
+def _template(text: str) -> tuple:
+    if _fields(text):
+        return text, text.format
+    return text.format(), None   # unescape {{ }} once
+
+
+def _builtin(code: str) -> dict:
+    """A config.py language in the same shape as a JSON catalog"""
+    labels = CITY_NAMES.get(code, {})
+    return {
+        "name": LANGUAGE_NAMES[code],
+        "texts": {key: texts[code] for key, texts in TEXTS.items() if code in texts},
+        "prayers": PRAYER_NAMES.get(code),
+        "hijri_months": HIJRI_MONTHS.get(code),
+        "weekdays": WEEKDAYS.get(code),
+        "methods": {method: names[code] for method, names in CALC_METHODS.items() if code in names},
+        "cities": [(city, labels.get(city, city)) for city in MAJOR_CITIES],
+    }
+
+
+def _compile(code: str, source: dict, reference: dict) -> Locale:
+    problems = []
+    texts = source.get("texts", {})
+    base = reference["texts"] if reference else texts
+    templates = {}
+    for key, fallback in base.items():
+        text = texts.get(key)
+        if text is None:
+            problems.append(f"missing {key}")
+            text = fallback
+        elif _fields(text) != _fields(fallback):
+            problems.append(f"placeholders of {key} differ from {REFERENCE_LANG}")
+            text = fallback
+        templates[key] = _template(text)
+    problems += [f"unknown key {key}" for key in texts.keys() - base.keys()]
+
+    def part(name, valid):
+        value = source.get(name)
+        if value is not None and valid(value):
+            return value
+        if reference:
+            problems.append(f"{name} missing or incomplete")
+            return reference[name]
+        raise ValueError(f"The {code} catalog needs a complete {name} entry")
+
+    prayers = part("prayers", lambda value: all(prayer in value for prayer in PRAYERS))
+    hijri_months = part("hijri_months", lambda value: len(value) == 12)
+    weekdays = part("weekdays", lambda value: len(value) == 7)
+    methods = {int(method): name for method, name in source.get("methods", {}).items()}
+    if reference and methods.keys() != reference["methods"].keys():
+        problems.append("method names incomplete")
+        methods = {**reference["methods"], **methods}
+    cities = [tuple(entry) for entry in part("cities", bool)]
+    problems += [f"city {city} is not in the gazetteer" for city, _label in cities if not canonical_city(city)]
+
+    # Today's timings as one template, e.g. "🌅 **Fajr**: {Fajr}" per line
+    templates["timings"] = _template("\n".join(
+        f"{icon} **{prayers[prayer]}**: {{{prayer}}}" for icon, prayer in zip(TIMINGS_ICONS, PRAYERS)
+    ))
+    if problems:
+        log.warning("Locale %s: %s", code, "; ".join(problems))
+    return Locale(code, source.get("name", code), templates, prayers, hijri_months, weekdays, methods, cities, dict(cities))
+
+
+def _referenced_keys() -> set:
+    """Text keys passed literally to _() anywhere in the bot"""
+    keys = set()
+    for filename in os.listdir(HERE):
+        if filename.endswith(".py"):
+            with open(os.path.join(HERE, filename), encoding="utf-8") as f:
+                keys.update(re.findall(r'\b_\(\s*"(\w+)"', f.read()))
+    return keys
+
+
+def load() -> dict:
+    """Compile every catalog; {code: Locale} with the built-in languages first"""
+    sources = {code: _builtin(code) for code in LANGUAGE_NAMES}
+    if os.path.isdir(LOCALES_DIR):
+        for filename in sorted(os.listdir(LOCALES_DIR)):
+            if filename.endswith(".json"):
+                with open(os.path.join(LOCALES_DIR, filename), encoding="utf-8") as f:
+                    sources[filename[:-len(".json")]] = json.load(f)
+
+    reference = sources[REFERENCE_LANG]
+    reference["methods"] = {int(method): name for method, name in reference["methods"].items()}
+    english = _compile(REFERENCE_LANG, reference, None)
+    missing = _referenced_keys() - english.templates.keys()
+    if missing:
+        raise KeyError(f"Text keys used in the code but missing from the {REFERENCE_LANG} catalog: {sorted(missing)}")
+    return {code: english if code == REFERENCE_LANG else _compile(code, source, reference)
+            for code, source in sources.items()}
+
+
+LOCALES = load()
+# Old buttons sent translated names and users type them too; resolve them to the gazetteer city
+for _locale in LOCALES.values():
+    for _city, _label in _locale.cities:
+        add_alias(_label, _city)
+
+
+def locale(code: str) -> Locale:
+    """The compiled catalog of a language, or the default one for unknown codes"""
+    return LOCALES.get(code) or LOCALES[DEFAULT_LANG]
+
+
+def city_labels() -> set:
+    """(name to match, city it stands for) for every city and label any catalog offers"""
+    return {pair for entry in LOCALES.values() for city, label in entry.cities for pair in ((city, city), (label, city))}
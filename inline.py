@@ -0,0 +1,111 @@
+"""
+Inline mode: `@bot Cair` autocompletes city names and shares today's times.
+
+Answers are built from the prayer-time cache only. A cache miss schedules a
+background warm-up so the next keystroke can hit, but the answer itself never
+waits on the API.
+"""
+import asyncio
+import bisect
+import logging
+import unicodedata
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+from i18n import city_labels, locale
+from utils import user_lang, calc_params, today_str, format_timings, cached_prayer_times, get_prayer_times
+
+log = logging.getLogger(__name__)
+
+MAX_RESULTS = 10
+CACHE_TIME = 300          # seconds Telegram may reuse an answer for the same query
+MAX_WARMING = 4
+
+
+def normalize(name: str) -> str:
+    """Case- and accent-insensitive form used for prefix matching"""
+    decomposed = unicodedata.normalize("NFKD", name.strip().casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+class CityIndex:
+    """Sorted (normalized name, city) pairs searched by bisection; a translated name maps to its city"""
+
+    def __init__(self, names=()):
+        self._entries = []
+        self._known = set()
+        for name, city in names:
+            self.add(city, name)
+
+    def add(self, city: str, name: str = None):
+        entry = (normalize(name or city), city)
+        if entry in self._known:
+            return
+        self._known.add(entry)
+        bisect.insort(self._entries, entry)
+
+    def search(self, prefix: str, limit: int = MAX_RESULTS) -> list:
+        prefix = normalize(prefix)
+        start = bisect.bisect_left(self._entries, (prefix, ""))
+        matches = []
+        for name, city in self._entries[start:]:
+            if not name.startswith(prefix) or len(matches) >= limit:
+                break
+            if city not in matches:
+                matches.append(city)
+        return matches
+
+
+city_index = CityIndex(city_labels())
+
+_warming = set()
+
+
+def _warm(app, city: str, method: int, school: int):
+    """Fetch a missing city in the background, a few at a time"""
+    key = (city, method, school)
+    if key in _warming or len(_warming) >= MAX_WARMING:
+        return
+
+    async def fetch():
+        try:
+            await asyncio.to_thread(get_prayer_times, city, None, None, method, school)
+        finally:
+            _warming.discard(key)
+
+    _warming.add(key)
+    app.create_task(fetch())
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer an inline query with cached times for matching cities"""
+    query = update.inline_query
+    lang = user_lang(context)
+    method, school = calc_params(context.user_data)
+
+    text = query.query.strip()
+    if text:
+        cities = [(city, city) for city in city_index.search(text)]
+    else:
+        own = context.user_data.get("city") if context.user_data else None
+        cities = ([(own, own)] if own else []) + locale(lang).cities[:MAX_RESULTS - 1]
+
+    results = []
+    for position, (city, label) in enumerate(cities):
+        times = cached_prayer_times(city, None, None, method, school)
+        if not times:
+            _warm(context.application, city, method, school)
+            continue
+        results.append(
+            InlineQueryResultArticle(
+                id=str(position),
+                title=label,
+                description=" · ".join(f"{name} {times[name]}" for name in ("Fajr", "Maghrib", "Isha")),
+                input_message_content=InputTextMessageContent(
+                    f"🕌 **{label}**\n📅 {today_str(lang)}\n\n{format_timings(times, lang)}",
+                    parse_mode="Markdown",
+                ),
+            )
+        )
+
+    # Results depend on the user's method/school, so don't share them across users
+    await query.answer(results, cache_time=CACHE_TIME, is_personal=True)
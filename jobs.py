@@ -1,52 +1,119 @@
 import datetime
+import functools
+import json
+import logging
 import pytz
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from utils import _, user_lang, get_prayer_times
-from keyboards import settings_keyboard
+from utils import _, get_prayer_times, city_zone, city_name, prayer_name
+from subscriptions import index_for, expand_record
+import clock
+import metrics
+from stats import stats_for
+import outbox
+import ramadan
+from inline import city_index
+from callbacks import pack
+
+log = logging.getLogger(__name__)
+
+# A prayer is announced on the tick before it, or up to this late if that tick
+# was missed (e.g. during a restart); fired marks stop it going out twice
+LATE_GRACE = 120
+
+@functools.lru_cache(maxsize=4096)
+def _athan_times(zone, date: datetime.date, timings: tuple) -> tuple:
+    """Localized (name, datetime) pairs for one day's timings; every tick of that day reuses them"""
+    athans = []
+    for name, t_str in timings:
+        try:
+            athans.append((name, zone.localize(datetime.datetime.combine(
+                date, datetime.datetime.strptime(t_str, "%H:%M").time()
+            ))))
+        except ValueError:
+            pass
+    return tuple(athans)
+
+def _due_prayer(times: dict, zone, now=None) -> str:
+    """Get the prayer whose time falls within the next minute (or just passed), if any"""
+    now = now or clock.now(zone)
+    for name, athan in _athan_times(zone, now.date(), tuple(times.items())):
+        if -LATE_GRACE < (athan - now).total_seconds() < 60:
+            return name
+    return None
 
 async def notify(ctx: ContextTypes.DEFAULT_TYPE):
-    chat_id = ctx.job.chat_id
-    city, country = ctx.job.data
-    lang = user_lang(ctx)
-    
-    if ctx.application.user_data.get(chat_id, {}).get("muted"):
+    """Fan out an azan alert to every chat sharing this (city, country, method, school)"""
+    city, country, method, school = ctx.job.data
+    index = index_for(ctx.application)
+    # Nobody left to notify (e.g. every member muted): skip the fetch entirely
+    if not index.audience.get(ctx.job.data):
         return
-    
-    times = get_prayer_times(city, country)
+
+    times = get_prayer_times(city, country, method=method, school=school)
     if not times:
         return
-        
-    zone = pytz.timezone("Africa/Cairo")
-    now = datetime.datetime.now(zone)
-    
-    for name, t_str in times.items():
-        try:
-            athan = datetime.datetime.strptime(t_str, "%H:%M").replace(
-                year=now.year, month=now.month, day=now.day, tzinfo=zone
+
+    zone = pytz.timezone(city_zone(city, country))
+    now = clock.now(zone)
+    name = _due_prayer(times, zone, now)
+    date = now.strftime("%d-%m-%Y")
+    if not name or not index.mark_fired(ctx.job.data, date, name):
+        return
+
+    iftar = name == "Maghrib" and ramadan.is_active()
+    broadcasts = ctx.application.bot_data.get("broadcasts", {})
+    recipients = index.recipients(ctx.job.data, name, int(times[name][:2]))
+    filtered = len(index.members(ctx.job.data)) - len(recipients)
+    if filtered:
+        metrics.inc("notifications_filtered", filtered, prayer=name)
+    expires = now.timestamp() + outbox.STALE_AFTER
+    markups = {}
+    texts = {}     # (lang, iftar text) -> alert, with the city and prayer named in that language
+    messages = []
+    for chat_id in recipients:
+        # Only the compact flags are needed, so idle users' full records can stay on disk
+        lang, _muted, iftar_alert = index.flags.get(chat_id, ("ar", False, False))[:3]
+        # Channel/group posts carry no settings button; those are changed via /broadcast
+        if chat_id in broadcasts:
+            markup = None
+        elif lang not in markups:
+            markup = markups[lang] = json.dumps(InlineKeyboardMarkup(
+                [[InlineKeyboardButton(_("settings", lang), callback_data=pack("settings"))]]
+            ).to_dict())
+        else:
+            markup = markups[lang]
+        text_key = (lang, iftar and iftar_alert)
+        text = texts.get(text_key)
+        if text is None:
+            label = city_name(city, lang)
+            text = texts[text_key] = (
+                _("iftar_now", lang, label) if text_key[1] else _("azan_now", lang, prayer_name(name, lang), label)
             )
-            if 0 < (athan - now).total_seconds() < 60:
-                await ctx.bot.send_message(
-                    chat_id,
-                    _("azan_now", lang, name, city),
-                    parse_mode="Markdown",
-                    reply_markup=InlineKeyboardMarkup(
-                        [[InlineKeyboardButton(_("settings", lang), callback_data="settings")]]
-                    ),
-                )
-                return
-        except ValueError:
-            pass
+        messages.append(outbox.Message(
+            outbox.message_key(chat_id, city, name, date), chat_id, text, "Markdown", markup, name, expires,
+        ))
+
+    # Queue the whole fan-out in one write before sending, so a crash part-way loses nothing
+    box = outbox.outbox_for(ctx.application)
+    stats = stats_for(ctx.application)
+    for message, result in await box.deliver(ctx.application, box.enqueue(messages)):
+        if result == outbox.SENT and message.chat_id in broadcasts:
+            stats.inc("broadcast_posts", city=city)
+            stats.inc("dms_avoided", broadcasts[message.chat_id].get("members", 0), city=city)
 
 async def restore_jobs(app):
-    for chat_id, data in app.user_data.items():
-        city = data.get("city")
-        if city:
-            app.job_queue.run_repeating(
-                notify,
-                interval=60,
-                first=10,
-                chat_id=int(chat_id),
-                name=str(chat_id),
-                data=(city, data.get("country", "")),
-            )
\ No newline at end of file
+    index = index_for(app)
+    records = app.bot_data.get("subscribers")
+    if records is None:
+        # First start since compact records were introduced: build them once from full user data
+        source = app.persistence.all_user_data() if hasattr(app.persistence, "all_user_data") else app.user_data.items()
+        records = {chat_id: data for chat_id, data in source if data.get("city")}
+    else:
+        records = {chat_id: expand_record(record) for chat_id, record in records.items()}
+    for chat_id, data in records.items():
+        index.subscribe(int(chat_id), data)
+        city_index.add(data["city"])
+    for chat_id, data in app.bot_data.get("broadcasts", {}).items():
+        index.subscribe(int(chat_id), data, broadcast=True)
+    log.info("Restored subscriptions: %s", index.stats())
@@ -1,41 +1,113 @@
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup
-from config import MAJOR_CITIES
-from utils import _
+import functools
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, KeyboardButton, ReplyKeyboardMarkup
+from config import CALC_METHODS, DEFAULT_LANG, DEFAULT_METHOD, DEFAULT_SCHOOL, PRAYERS, ALL_PRAYERS, QUIET_WINDOWS
+from i18n import LOCALES, locale
+from utils import _, hours_mask
+from callbacks import pack
 
-def settings_keyboard(lang: str, is_muted: bool) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton(_("toggle_mute_on" if is_muted else "toggle_mute_off", lang), callback_data="toggle_mute")],
-        [InlineKeyboardButton(_("change_city", lang), callback_data="choose_city")],
-        [InlineKeyboardButton("English" if lang == "ar" else "العربية", callback_data="toggle_lang")],
-        [InlineKeyboardButton(_("close", lang), callback_data="close")],
-    ])
+# Markups are immutable, so each one is built once and shared by every update that shows it
+MAX_CACHED = 1024
+
+def _per_locale(build):
+    """Build a keyboard that only depends on the language once per locale, at import"""
+    built = {code: build(code) for code in LOCALES}
+
+    @functools.wraps(build)
+    def get(lang: str):
+        return built.get(lang) or built[DEFAULT_LANG]
+    return get
+
+def _prayers_label(lang: str, prayers: int) -> str:
+    if prayers == ALL_PRAYERS:
+        return _("prayers_all", lang)
+    names = locale(lang).prayers
+    chosen = [names[name] for bit, name in enumerate(PRAYERS) if prayers >> bit & 1]
+    if not chosen:
+        return _("prayers_none", lang)
+    return _("list_separator", lang).join(chosen)
+
+def quiet_window(quiet: int):
+    """The QUIET_WINDOWS entry a stored hour mask came from (None if off or unknown)"""
+    for window in QUIET_WINDOWS:
+        if window and hours_mask(window) == quiet:
+            return window
+    return None
 
+@functools.lru_cache(maxsize=MAX_CACHED)
+def settings_keyboard(lang: str, is_muted: bool, method: int = DEFAULT_METHOD, school: int = DEFAULT_SCHOOL,
+                      iftar_alert: bool = None, prayers: int = ALL_PRAYERS, quiet: int = 0) -> InlineKeyboardMarkup:
+    methods = locale(lang).methods
+    method_name = methods.get(method, methods[DEFAULT_METHOD])
+    window = quiet_window(quiet)
+    rows = [
+        [InlineKeyboardButton(_("toggle_mute_on" if is_muted else "toggle_mute_off", lang), callback_data=pack("toggle_mute"))],
+        [InlineKeyboardButton(_("prayers_button", lang, _prayers_label(lang, prayers)), callback_data=pack("choose_prayers"))],
+        [InlineKeyboardButton(_("quiet_on", lang, *window) if window else _("quiet_off", lang), callback_data=pack("cycle_quiet"))],
+        [InlineKeyboardButton(_("change_city", lang), callback_data=pack("choose_city"))],
+        [InlineKeyboardButton(_("calc_method", lang, method_name), callback_data=pack("choose_method"))],
+        [InlineKeyboardButton(_("asr_school", lang, _(f"school_{school}", lang)), callback_data=pack("toggle_school"))],
+    ]
+    # Only offered while Ramadan mode is active
+    if iftar_alert is not None:
+        rows.append([InlineKeyboardButton(_("iftar_alert_on" if iftar_alert else "iftar_alert_off", lang), callback_data=pack("toggle_iftar"))])
+    rows.append([InlineKeyboardButton(_("change_lang", lang), callback_data=pack("toggle_lang"))])
+    rows.append([InlineKeyboardButton(_("close", lang), callback_data=pack("close"))])
+    return InlineKeyboardMarkup(rows)
+
+@_per_locale
 def main_menu_kb(lang: str) -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
-        [[_("today", lang), _("settings", lang)]],
+        [
+            [_("today", lang), _("settings", lang)],
+            [KeyboardButton(_("share_location", lang), request_location=True)],
+        ],
         resize_keyboard=True,
         input_field_placeholder=_("choose_from_menu", lang)
     )
 
+@_per_locale
 def city_selection_keyboard(lang: str) -> InlineKeyboardMarkup:
-    flat = MAJOR_CITIES.get(lang, MAJOR_CITIES["ar"])
+    flat = locale(lang).cities
     buttons = [
-        [InlineKeyboardButton(city, callback_data=f"city_{city}") for city in flat[i : i + 2]]
+        [InlineKeyboardButton(label, callback_data=pack("city", city)) for city, label in flat[i : i + 2]]
         for i in range(0, len(flat), 2)
     ]
-    buttons.append([InlineKeyboardButton(_("enter_city", lang), callback_data="enter_city")])
-    buttons.append([InlineKeyboardButton(_("back", lang), callback_data="settings")])
+    buttons.append([InlineKeyboardButton(_("enter_city", lang), callback_data=pack("enter_city"))])
+    buttons.append([InlineKeyboardButton(_("back", lang), callback_data=pack("settings"))])
     return InlineKeyboardMarkup(buttons)
 
+@_per_locale
 def language_keyboard(lang: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([
-        [InlineKeyboardButton("العربية", callback_data="set_lang_ar")],
-        [InlineKeyboardButton("English", callback_data="set_lang_en")],
-        [InlineKeyboardButton(_("back", lang), callback_data="settings")],
-    ])
+    buttons = [
+        [InlineKeyboardButton(("✅ " if code == lang else "") + entry.name, callback_data=pack("set_lang", code))]
+        for code, entry in LOCALES.items()
+    ]
+    buttons.append([InlineKeyboardButton(_("back", lang), callback_data=pack("settings"))])
+    return InlineKeyboardMarkup(buttons)
+
+@functools.lru_cache(maxsize=MAX_CACHED)
+def method_keyboard(lang: str, current: int) -> InlineKeyboardMarkup:
+    names = locale(lang).methods
+    buttons = [
+        [InlineKeyboardButton(("✅ " if method == current else "") + names[method], callback_data=pack("method", method))]
+        for method in CALC_METHODS
+    ]
+    buttons.append([InlineKeyboardButton(_("back", lang), callback_data=pack("settings"))])
+    return InlineKeyboardMarkup(buttons)
+
+@functools.lru_cache(maxsize=MAX_CACHED)
+def prayers_keyboard(lang: str, prayers: int) -> InlineKeyboardMarkup:
+    names = locale(lang).prayers
+    buttons = [
+        [InlineKeyboardButton(("✅ " if prayers >> bit & 1 else "⬜ ") + names[name], callback_data=pack("toggle_prayer", bit))]
+        for bit, name in enumerate(PRAYERS)
+    ]
+    buttons.append([InlineKeyboardButton(_("back", lang), callback_data=pack("settings"))])
+    return InlineKeyboardMarkup(buttons)
 
+@_per_locale
 def after_city_selection_keyboard(lang: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup([
-        [InlineKeyboardButton(_("refresh", lang), callback_data="refresh")],
-        [InlineKeyboardButton(_("settings", lang), callback_data="settings")],
+        [InlineKeyboardButton(_("refresh", lang), callback_data=pack("refresh"))],
+        [InlineKeyboardButton(_("settings", lang), callback_data=pack("settings"))],
     ])
\ No newline at end of file
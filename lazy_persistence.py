@@ -0,0 +1,135 @@
+"""
+PicklePersistence variant that keeps user_data out of RAM until it is needed.
+
+Each user's dict lives in its own SQLite row and is loaded the first time an
+update from that user is processed. Users who stay idle are written back and
+evicted from Application.user_data, least recently used first. Fan-out never
+touches user_data: it works from the compact subscription index in bot_data.
+"""
+import asyncio
+import logging
+import pickle
+import sqlite3
+import time
+from collections import OrderedDict
+from telegram.ext import ContextTypes, PersistenceInput, PicklePersistence
+
+log = logging.getLogger(__name__)
+
+IDLE_TTL = 30 * 60        # evict users idle for this long (seconds)
+MAX_RESIDENT = 5000       # and never keep more than this many in memory
+EVICT_INTERVAL = 60
+
+
+class LazyPicklePersistence(PicklePersistence):
+    def __init__(self, filepath, users_db: str = None, idle_ttl: float = IDLE_TTL,
+                 max_resident: int = MAX_RESIDENT, **kwargs):
+        # chat_data is unused by the bot, so don't keep a second copy of every chat
+        kwargs.setdefault("store_data", PersistenceInput(chat_data=False))
+        super().__init__(filepath, **kwargs)
+        self.idle_ttl = idle_ttl
+        self.max_resident = max_resident
+        self._db = sqlite3.connect(users_db or f"{filepath}.users.sqlite", check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, data BLOB NOT NULL)")
+        self._db.commit()
+        self._access = OrderedDict()   # user id -> last access, least recent first
+        self._evicting = set()
+        self._app = None
+        self._commit_scheduled = False
+
+    def _write(self, user_id: int, data: dict):
+        self._db.execute(
+            "INSERT OR REPLACE INTO users (id, data) VALUES (?, ?)",
+            (user_id, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+
+    def _read(self, user_id: int):
+        row = self._db.execute("SELECT data FROM users WHERE id = ?", (user_id,)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    async def get_user_data(self):
+        """Migrate any user_data still in the pickle file, then start empty"""
+        legacy = await super().get_user_data()
+        if legacy:
+            for user_id, data in legacy.items():
+                self._write(user_id, data)
+            self._db.commit()
+            log.info("Moved %d users from the pickle file to %s", len(legacy), self._db_path())
+        self.user_data = {}
+        return {}
+
+    def _db_path(self) -> str:
+        return self._db.execute("PRAGMA database_list").fetchone()[2]
+
+    def all_user_data(self):
+        """Iterate every stored (user id, data) pair; for one-off rebuilds only"""
+        for user_id, blob in self._db.execute("SELECT id, data FROM users"):
+            yield user_id, pickle.loads(blob)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        """Load a user's dict on first access and mark it recently used"""
+        if user_id not in self._access and not user_data:
+            stored = self._read(user_id)
+            if stored:
+                user_data.update(stored)
+        self._access[user_id] = time.monotonic()
+        self._access.move_to_end(user_id)
+
+    def _commit_soon(self):
+        """Commit once after the current batch: update_persistence gathers one write per changed user"""
+        if not self._commit_scheduled:
+            self._commit_scheduled = True
+            asyncio.get_running_loop().call_soon(self._commit)
+
+    def _commit(self):
+        self._commit_scheduled = False
+        self._db.commit()
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._write(user_id, data)
+        self._commit_soon()
+
+    async def drop_user_data(self, user_id: int):
+        if user_id in self._evicting:
+            # Evicted, not deleted; if the user came back meanwhile, keep their latest data
+            self._evicting.discard(user_id)
+            if user_id in self._access and self._app is not None:
+                self._write(user_id, self._app.user_data.get(user_id, {}))
+                self._commit_soon()
+            return
+        self._access.pop(user_id, None)
+        self._db.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        self._commit_soon()
+
+    async def flush(self):
+        await super().flush()
+        self._db.commit()
+
+    async def evict(self, app) -> int:
+        """Write back and drop idle users, oldest first; returns how many were evicted"""
+        self._app = app
+        now = time.monotonic()
+        evicted = 0
+        while self._access:
+            user_id, last = next(iter(self._access.items()))
+            if now - last < self.idle_ttl and len(self._access) <= self.max_resident:
+                break
+            del self._access[user_id]
+            data = app.user_data.get(user_id)
+            if data is not None:
+                self._write(user_id, data)
+                self._evicting.add(user_id)
+                app.drop_user_data(user_id)
+                evicted += 1
+        if evicted:
+            self._db.commit()
+            log.info("Evicted %d idle users (%d resident)", evicted, len(self._access))
+        return evicted
+
+
+async def evict_idle_users(ctx: ContextTypes.DEFAULT_TYPE):
+    persistence = ctx.application.persistence
+    if isinstance(persistence, LazyPicklePersistence):
+        await persistence.evict(ctx.application)
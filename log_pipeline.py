@@ -0,0 +1,136 @@
+"""
+Non-blocking logging pipeline.
+
+Records are handed to a queue on the event-loop thread and formatted and
+written by a background listener thread. Message formatting is deferred until
+the writer thread, high-volume message keys are rate limited and sampled
+before they are enqueued, and output is one JSON object per line.
+
+Call sites opt in to per-key policies with ``extra``:
+
+    log.info("Fetching %s", city, extra={"log_key": "fetch", "sample_rate": 0.1})
+
+Without ``log_key`` the key is the logger name plus the unformatted message
+template, which is why hot paths should log with %-style arguments rather
+than f-strings.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+DEFAULT_BURST = 30        # records allowed per key per window
+DEFAULT_WINDOW = 60.0     # seconds
+
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as a single JSON line, including any `extra` fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _STANDARD_ATTRS and name not in ("log_key", "sample_rate"):
+                entry[name] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-key token window with optional sampling.
+
+    Each key may emit `burst` records per `window` seconds; the rest are
+    dropped and counted, and the count is attached to the next record that
+    gets through as `suppressed`. Records carrying `sample_rate` are
+    additionally kept with that probability. Warnings and above are never
+    sampled, only rate limited.
+    """
+
+    def __init__(self, burst: int = DEFAULT_BURST, window: float = DEFAULT_WINDOW):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "log_key", None) or (record.name, record.msg)
+        rate = getattr(record, "sample_rate", None)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+
+        now = time.monotonic()
+        with self._lock:
+            started, count, dropped = self._windows.get(key, (now, 0, 0))
+            if now - started >= self.window:
+                started, count = now, 0
+            if count >= self.burst:
+                self._windows[key] = (started, count, dropped + 1)
+                return False
+            self._windows[key] = (started, count + 1, 0)
+
+        if dropped:
+            record.suppressed = dropped
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread"""
+
+    def prepare(self, record):
+        return record
+
+
+def setup_logging(level=logging.INFO, json_output: bool = True, burst: int = DEFAULT_BURST,
+                  window: float = DEFAULT_WINDOW, stream=None):
+    """Route the root logger through a queue drained by a background thread"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(message)s"))
+
+    records = queue.SimpleQueue()
+    handler = DeferredQueueHandler(records)
+    handler.addFilter(RateLimitFilter(burst, window))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # httpx logs every Bot API request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush pending records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
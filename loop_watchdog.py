@@ -0,0 +1,127 @@
+"""
+Event-loop lag watchdog.
+
+A heartbeat task on the loop stamps the time every INTERVAL seconds. A
+watcher thread checks the stamp; once it is more than `threshold` old the
+loop is blocked, and the watcher captures the loop thread's stack right then,
+while the blocking call is still on it. The first project frame entered
+from library code names the handler or job that was running; the innermost
+project frame names the call that blocked. When the loop recovers the stall
+is counted in metrics and logged, rate limited per (owner, blocking site) by
+the logging pipeline.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import metrics
+
+log = logging.getLogger(__name__)
+
+INTERVAL = 0.05
+STACK_DEPTH = 12
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _ours(frame) -> bool:
+    filename = frame.f_code.co_filename
+    return filename.startswith(PROJECT_DIR) and filename != __file__ and "site-packages" not in filename
+
+
+def _where(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _function(frame) -> str:
+    """Where a frame's function is defined; stable across stalls, unlike the live line"""
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def attribute(frame) -> tuple:
+    """(owner, blocking site, stack lines) for a frame captured on the loop thread.
+
+    Handlers and jobs are entered from library code (asyncio, PTB, APScheduler),
+    so the owner is the first project frame called from a non-project one below
+    the entry point, named by its definition so every stall in one handler shares a
+    label; the site is the innermost project frame at its current line.
+    """
+    stack = []
+    while frame is not None:
+        stack.append(frame)
+        frame = frame.f_back
+    stack.reverse()
+    owner = next((stack[i] for i in range(1, len(stack)) if _ours(stack[i]) and not _ours(stack[i - 1])), None)
+    site = next((f for f in reversed(stack) if _ours(f)), None)
+    return (
+        _function(owner) if owner else "unknown",
+        _where(site) if site else _where(stack[-1]),
+        [_where(f) for f in stack[-STACK_DEPTH:]],
+    )
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self._beat = time.monotonic()
+        self._stall = None          # (owner, site, stack) captured during the current stall
+        self._stop = threading.Event()
+        self._task = None
+        self._thread = None
+        self._loop_thread = None
+
+    def start(self):
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        log.info("Loop watchdog on (threshold %.0f ms)", self.threshold * 1000)
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    async def _heartbeat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(INTERVAL)
+            now = time.monotonic()
+            lag = max(0.0, now - before - INTERVAL)
+            self._beat = now
+            metrics.set_gauge("loop_lag_ms", round(lag * 1000, 1))
+            if lag > metrics.get("loop_lag_max_ms") / 1000:
+                metrics.set_gauge("loop_lag_max_ms", round(lag * 1000, 1))
+            if lag >= self.threshold:
+                self._report(lag)
+            else:
+                self._stall = None
+
+    def _watch(self):
+        while not self._stop.wait(INTERVAL / 2):
+            # The heartbeat is due every INTERVAL; anything beyond that is lag
+            if self._stall is None and time.monotonic() - self._beat >= INTERVAL + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stall = attribute(frame)
+
+    def _report(self, lag: float):
+        owner, site, stack = self._stall or ("unknown", "unknown", [])
+        self._stall = None
+        metrics.inc("loop_stalls", owner=owner)
+        metrics.inc("loop_stall_ms", int(lag * 1000), owner=owner)
+        log.warning(
+            "Event loop blocked for %.0f ms in %s at %s\n  %s",
+            lag * 1000, owner, site, "\n  ".join(stack),
+            extra={"log_key": ("loop_stall", owner, site)},
+        )
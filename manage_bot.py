@@ -8,6 +8,9 @@ import subprocess
 import signal
 import time
 from pathlib import Path
+from control import read_pid_file, send_command
+
+TAKEOVER_TIMEOUT = 120   # the standby replies once it has loaded the handed-over state and polls
 
 def show_help():
     """Show help message"""
@@ -23,21 +26,28 @@ def show_help():
     print("  clear     - Clear webhook and prepare bot")
     print("  test      - Test bot token")
     print("  logs      - Show recent logs (if available)")
+    print("  profile N - Profile the running bot for N seconds")
     print("  help      - Show this help message")
     print()
 
 def get_bot_pid():
-    """Get the PID of running bot process"""
+    """Get the PID of the active bot process from its PID file"""
+    return read_pid_file()
+
+def wait_for(predicate, timeout, interval=0.1):
+    """Poll until predicate() is truthy or the timeout expires"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = predicate()
+        if result:
+            return result
+        time.sleep(interval)
+    return None
+
+def ping(pid):
     try:
-        result = subprocess.run(
-            ["pgrep", "-f", "python.*bot.py"],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode == 0 and result.stdout.strip():
-            return int(result.stdout.strip().split('\n')[0])
-        return None
-    except:
+        return send_command(pid, "ping", timeout=2)
+    except OSError:
         return None
 
 def start_bot():
@@ -58,9 +68,8 @@ def start_bot():
     print("🤖 Starting bot...")
     subprocess.Popen([sys.executable, "bot.py"])
     
-    # Wait a moment and check if it started
-    time.sleep(2)
-    pid = get_bot_pid()
+    # Wait for it to take ownership of the PID file
+    pid = wait_for(get_bot_pid, timeout=30)
     if pid:
         print(f"✅ Bot started successfully (PID: {pid})")
     else:
@@ -76,8 +85,12 @@ def stop_bot():
         return
     
     try:
-        os.kill(pid, signal.SIGTERM)
-        time.sleep(2)
+        # Ask for a graceful shutdown over the control socket, falling back to SIGTERM
+        try:
+            send_command(pid, "stop", timeout=5)
+        except OSError:
+            os.kill(pid, signal.SIGTERM)
+        wait_for(lambda: not get_bot_pid(), timeout=15)
         
         # Check if still running
         if get_bot_pid():
@@ -96,11 +109,59 @@ def stop_bot():
         print(f"❌ Error stopping bot: {e}")
 
 def restart_bot():
-    """Restart the bot"""
+    """Restart the bot with a warm standby so no updates or azan alerts are lost"""
     print("🔄 Restarting Azan Time Bot...")
-    stop_bot()
-    time.sleep(1)
-    start_bot()
+    old_pid = get_bot_pid()
+    if not old_pid or not ping(old_pid):
+        print("ℹ️  No running instance to hand over from")
+        stop_bot()
+        start_bot()
+        return
+
+    # 1. Start the replacement; it warms caches but does not poll yet
+    standby = subprocess.Popen([sys.executable, "bot.py", "--standby"])
+    reply = wait_for(lambda: ping(standby.pid), timeout=120, interval=0.2)
+    if not reply or "standby" not in reply:
+        print("❌ Standby instance did not come up; keeping the current bot")
+        standby.terminate()
+        return
+    print(f"⏸️  Standby ready (PID: {standby.pid})")
+
+    # 2. The old instance stops polling and the scheduler and returns its state,
+    # 3. which the standby imports; it replies once it polls and handles updates
+    started = time.monotonic()
+    try:
+        state = send_command(old_pid, "handoff")
+    except OSError as e:
+        print(f"❌ Handoff failed: {e}; keeping the current bot")
+        standby.terminate()
+        return
+    # The old instance has stopped polling by now, so from here on someone must take over
+    try:
+        result = send_command(standby.pid, f"takeover {state}", timeout=TAKEOVER_TIMEOUT)
+    except OSError as e:
+        result = str(e)
+    if result != "ok":
+        # Without the fired marks an alert inside the grace window may be queued again; the outbox drops repeats
+        print(f"⚠️  Takeover with state failed ({result!r}); retrying without it")
+        try:
+            result = send_command(standby.pid, "takeover", timeout=TAKEOVER_TIMEOUT)
+        except OSError as e:
+            result = str(e)
+    gap = (time.monotonic() - started) * 1000
+    if result != "ok":
+        print(f"❌ Takeover failed: {result}; starting a fresh instance")
+        standby.terminate()
+        wait_for(lambda: not ping(old_pid), timeout=60)
+        start_bot()
+        return
+    print(f"✅ Bot restarted (PID: {old_pid} -> {standby.pid}, handoff took {gap:.0f} ms)")
+
+    # 4. The old instance drains its in-flight sends and exits on its own
+    if wait_for(lambda: not ping(old_pid), timeout=60):
+        print("✅ Previous instance drained and exited")
+    else:
+        print("⚠️  Previous instance is still draining")
 
 def check_status():
     """Check bot status"""
@@ -143,6 +204,20 @@ def test_token():
     else:
         print("❌ Token test failed")
 
+def profile_bot(seconds):
+    """Profile the running bot through its control socket"""
+    pid = get_bot_pid()
+    if not pid:
+        print("❌ Bot is not running")
+        return
+    print(f"⏱️  Profiling PID {pid} for {seconds} seconds...")
+    try:
+        path = send_command(pid, f"profile {seconds}", timeout=float(seconds) + 30)
+    except OSError as e:
+        print(f"❌ Profile failed: {e}")
+        return
+    print(f"✅ Report written to {path}")
+
 def main():
     """Main function"""
     if len(sys.argv) < 2:
@@ -163,6 +238,8 @@ def main():
         clear_webhook()
     elif command == "test":
         test_token()
+    elif command == "profile":
+        profile_bot(sys.argv[2] if len(sys.argv) > 2 else "10")
     elif command == "help":
         show_help()
     else:
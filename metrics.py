@@ -0,0 +1,48 @@
+"""
+In-process metrics surface: labelled counters and gauges read by admin tools
+"""
+import threading
+from collections import Counter
+
+_lock = threading.Lock()
+_counters = Counter()
+_gauges = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name: str, amount: int = 1, **labels):
+    """Increment a counter"""
+    with _lock:
+        _counters[_key(name, labels)] += amount
+
+
+def set_gauge(name: str, value, **labels):
+    """Set a gauge to its current value"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def get(name: str, **labels):
+    """Read a counter, or a gauge if no counter by that name exists"""
+    key = _key(name, labels)
+    with _lock:
+        if key in _counters:
+            return _counters[key]
+        return _gauges.get(key, 0)
+
+
+def snapshot() -> dict:
+    """All metrics as {"name{label=value,...}": value}"""
+    def render(key):
+        name, labels = key
+        if not labels:
+            return name
+        return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+    with _lock:
+        result = {render(key): value for key, value in _counters.items()}
+        result.update({render(key): value for key, value in _gauges.items()})
+    return result
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Run several branded bots (one per BOT_TOKENS entry) in a single process.
+
+Each bot keeps its own persistence file and subscribers, while the
+prayer-time cache, the inline city index and the Aladhan connection pool are
+module-level and therefore shared, so upstream calls and memory grow with the
+number of distinct cities rather than with the number of bots.
+"""
+import asyncio
+import logging
+import signal
+import sys
+from config import BOT_TOKENS, LOOP_LAG_THRESHOLD_MS
+from bot import build_application
+from jobs import restore_jobs
+from outbox import replay
+from loop_watchdog import LoopWatchdog
+
+log = logging.getLogger(__name__)
+
+
+async def run_all(tokens: dict):
+    apps = {name: build_application(token, f"bot_data_{name}.pickle") for name, token in tokens.items()}
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # One loop serves every bot, so one watchdog covers them all
+    watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD_MS / 1000) if LOOP_LAG_THRESHOLD_MS else None
+    if watchdog:
+        watchdog.start()
+
+    started = []
+    try:
+        for name, app in apps.items():
+            await app.initialize()
+            if app.post_init:
+                await app.post_init(app)
+            await restore_jobs(app)
+            await app.updater.start_polling(drop_pending_updates=True)
+            await app.start()
+            app.create_task(replay(app))
+            started.append(app)
+            log.info("✅ Bot %s is polling", name)
+
+        log.info("🚀 %d bots running in one process", len(started))
+        await stop.wait()
+    finally:
+        for app in reversed(started):
+            if app.updater.running:
+                await app.updater.stop()
+            if app.running:
+                await app.stop()
+            await app.shutdown()
+        if watchdog:
+            await watchdog.stop()
+        log.info("🛑 All bots stopped")
+
+
+def main():
+    if not BOT_TOKENS:
+        log.error("❌ BOT_TOKENS is not set in .env file")
+        log.error("Example: BOT_TOKENS=egypt=123:abc,turkey=456:def")
+        sys.exit(1)
+
+    asyncio.run(run_all(BOT_TOKENS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Durable outbox between the fan-out and the Bot API.
+
+Each message is appended to SQLite before it is sent. It is keyed by
+(chat, city, prayer, date), so if the same alert is produced twice, for
+example by a tick in the grace window after a restart, it is queued only
+once. Deliveries are recorded in a second append-only table in batches.
+Anything still unacknowledged after a crash, or after a 5xx or timeout, is
+replayed on startup and by a periodic job while it is still relevant.
+Messages past their expiry are dropped.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sqlite3
+from collections import namedtuple
+from weakref import WeakKeyDictionary
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter
+import clock
+import metrics
+from stats import stats_for
+from subscriptions import index_for
+
+log = logging.getLogger(__name__)
+
+STALE_AFTER = 20 * 60      # an alert is worth sending up to this long after it was produced (seconds)
+KEEP_FOR = 24 * 60 * 60    # keep delivered rows this long past expiry, so the same key can't be queued again
+ACK_BATCH = 100            # delivery marks written per transaction
+RETRY_INTERVAL = 30        # how often unacknowledged messages are retried (seconds)
+REPLAY_CONCURRENCY = 20
+FLOOD_WAIT = 5             # flood-control pauses up to this long are waited out; longer ones are left to the retry job
+
+SENT, FAILED, RETRY, EXPIRED, GONE = "sent", "failed", "retry", "expired", "gone"
+
+Message = namedtuple("Message", "key chat_id text parse_mode markup prayer expires")
+
+_outboxes = WeakKeyDictionary()
+
+
+def message_key(chat_id: int, city: str, prayer: str, date: str) -> str:
+    return f"{chat_id}|{city}|{prayer}|{date}"
+
+
+def _timestamp() -> float:
+    return clock.now(datetime.timezone.utc).timestamp()
+
+
+def _seconds(retry_after) -> float:
+    return retry_after.total_seconds() if isinstance(retry_after, datetime.timedelta) else float(retry_after)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _outcome(error: Exception) -> str:
+    """GONE if the chat will never accept messages again (blocked, deactivated, deleted),
+    FAILED if only this message was rejected, RETRY for timeouts, 5xx and flood control"""
+    if isinstance(error, Forbidden) or (isinstance(error, BadRequest) and "chat not found" in error.message.lower()):
+        return GONE
+    if isinstance(error, BadRequest):
+        return FAILED
+    return RETRY
+
+
+class Outbox:
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                key TEXT PRIMARY KEY, chat_id INTEGER NOT NULL, text TEXT NOT NULL,
+                parse_mode TEXT, markup TEXT, prayer TEXT, expires REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS outbox_expires ON outbox (expires);
+            CREATE TABLE IF NOT EXISTS acks (key TEXT PRIMARY KEY, outcome TEXT NOT NULL, at REAL NOT NULL);
+        """)
+        self._db.commit()
+        self._acks = []           # (key, outcome, at) not yet written
+        self._inflight = set()    # keys being sent right now, so a replay doesn't send them again
+        self._markups = {}        # JSON -> InlineKeyboardMarkup
+        self._flood_until = 0.0   # loop time until which the Bot API asked us to stop sending
+        self.previous_pid = None  # instance that handed over; its acks are only on disk once it exits
+
+    def enqueue(self, messages: list) -> list:
+        """Append messages in one transaction; returns those still to be sent"""
+        if not messages:
+            return []
+        with self._db:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, ?, ?, ?)", messages)
+            added = self._db.total_changes - before
+        if added == len(messages):
+            return messages
+        # Some were queued before (e.g. by the run that crashed); only those never delivered go out
+        fresh = self._unacked([m.key for m in messages])
+        return [m for m in messages if m.key in fresh]
+
+    def _unacked(self, keys: list) -> set:
+        self.flush()
+        unacked = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ",".join("?" * len(chunk))
+            unacked.update(key for key, in self._db.execute(
+                f"SELECT key FROM outbox WHERE key IN ({marks}) AND key NOT IN (SELECT key FROM acks WHERE key IN ({marks}))",
+                chunk + chunk,
+            ))
+        return unacked - self._inflight
+
+    def ack(self, key: str, outcome: str):
+        self._acks.append((key, outcome, _timestamp()))
+        if len(self._acks) >= ACK_BATCH:
+            self.flush()
+
+    def flush(self):
+        if self._acks:
+            with self._db:
+                self._db.executemany("INSERT OR IGNORE INTO acks VALUES (?, ?, ?)", self._acks)
+            self._acks = []
+
+    def pending(self, now: float) -> list:
+        """Unacknowledged, unexpired messages that aren't being sent right now"""
+        self.flush()
+        rows = self._db.execute(
+            "SELECT * FROM outbox WHERE expires > ? AND key NOT IN (SELECT key FROM acks) ORDER BY expires",
+            (now,),
+        )
+        return [Message(*row) for row in rows if row[0] not in self._inflight]
+
+    def drop_expired(self, now: float) -> int:
+        with self._db:
+            return self._db.execute(
+                "INSERT INTO acks SELECT key, ?, ? FROM outbox WHERE expires <= ? AND key NOT IN (SELECT key FROM acks)",
+                (EXPIRED, now, now),
+            ).rowcount
+
+    def compact(self, now: float):
+        with self._db:
+            self._db.execute("DELETE FROM acks WHERE key IN (SELECT key FROM outbox WHERE expires < ?)", (now - KEEP_FOR,))
+            self._db.execute("DELETE FROM outbox WHERE expires < ?", (now - KEEP_FOR,))
+
+    def _markup(self, markup: str, bot):
+        if markup is None:
+            return None
+        cached = self._markups.get(markup)
+        if cached is None:
+            cached = self._markups[markup] = InlineKeyboardMarkup.de_json(json.loads(markup), bot)
+        return cached
+
+    async def deliver(self, app, messages: list, concurrency: int = 1) -> list:
+        """Send queued messages and record each outcome; returns [(message, outcome)]"""
+        bot = app.bot
+        index = index_for(app)
+        stats = stats_for(app)
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+        keys = {m.key for m in messages}
+        self._inflight |= keys
+
+        async def send(message):
+            async with semaphore:
+                outcome = RETRY
+                chat_id = message.chat_id
+                # One more attempt after a short flood-control pause; a long one leaves the rest unsent
+                for _attempt in range(2):
+                    wait = self._flood_until - loop.time()
+                    if wait > FLOOD_WAIT:
+                        break
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    try:
+                        await bot.send_message(
+                            chat_id, message.text,
+                            parse_mode=message.parse_mode, reply_markup=self._markup(message.markup, bot),
+                        )
+                        outcome = SENT
+                    except RetryAfter as e:
+                        self._flood_until = max(self._flood_until, loop.time() + _seconds(e.retry_after))
+                        log.warning("Flood control while notifying %s: retry in %s s", message.chat_id, e.retry_after)
+                        continue
+                    except ChatMigrated as e:
+                        # A group upgraded to a supergroup: follow it, or it would be retried until expiry
+                        if chat_id != message.chat_id:
+                            outcome = FAILED
+                            break
+                        if index.migrate(chat_id, e.new_chat_id):
+                            log.info("Chat %s migrated to %s", chat_id, e.new_chat_id)
+                        chat_id = e.new_chat_id
+                        continue
+                    except Exception as e:
+                        outcome = _outcome(e)
+                        if outcome == GONE:
+                            # Stop fetching and sending for it; its record waits for the next /start
+                            if index.prune(message.chat_id):
+                                stats.inc("chats_pruned")
+                                log.info("Pruned chat %s from the fan-out: %s", message.chat_id, e)
+                        else:
+                            log.warning("Failed to notify %s: %s", message.chat_id, e)
+                    break
+                if outcome != RETRY:
+                    # Retries are sent again later; only the final outcome counts toward /stats
+                    self.ack(message.key, outcome)
+                    stats.deliveries.record(message.prayer, outcome == SENT)
+                return message, outcome
+
+        try:
+            if concurrency == 1:
+                return [await send(message) for message in messages]
+            return await asyncio.gather(*(send(message) for message in messages))
+        finally:
+            self.flush()
+            self._inflight -= keys
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+
+def attach(app, path: str) -> Outbox:
+    """Give an application a file-backed outbox; apps without one get an in-memory outbox"""
+    box = _outboxes[app] = Outbox(path)
+    return box
+
+
+def outbox_for(app) -> Outbox:
+    box = _outboxes.get(app)
+    if box is None:
+        box = _outboxes[app] = Outbox()
+    return box
+
+
+async def replay(app) -> int:
+    """Drop expired messages and resend the rest at full speed; returns how many were sent"""
+    box = outbox_for(app)
+    if box.previous_pid:
+        # Rows the old instance is still sending look unacked until it has drained and exited
+        if _alive(box.previous_pid):
+            log.info("Outbox replay waits for PID %s to exit", box.previous_pid)
+            return 0
+        box.previous_pid = None
+    now = _timestamp()
+    dropped = box.drop_expired(now)
+    if dropped:
+        metrics.inc("outbox_expired", dropped)
+        log.info("Dropped %d expired outbox messages", dropped)
+    pending = box.pending(now)
+    sent = 0
+    if pending:
+        results = await box.deliver(app, pending, concurrency=REPLAY_CONCURRENCY)
+        sent = sum(outcome == SENT for _message, outcome in results)
+        metrics.inc("outbox_replayed", sent)
+        log.info("Replayed %d of %d pending outbox messages", sent, len(pending))
+    box.compact(now)
+    return sent
+
+
+async def retry_pending(ctx):
+    await replay(ctx.application)
@@ -0,0 +1,76 @@
+import asyncio
+import datetime
+import logging
+import random
+import pytz
+import clock
+from telegram.ext import ContextTypes
+from utils import city_zone, cached_prayer_times, get_prayer_times
+from subscriptions import index_for
+
+log = logging.getLogger(__name__)
+
+PREFETCH_INTERVAL = 300       # how often the prefetcher wakes up (seconds)
+PREFETCH_WINDOW = 45 * 60     # start warming this long before local midnight
+MIDNIGHT_MARGIN = 60          # never start a fetch closer than this to midnight
+MAX_CONCURRENCY = 4
+MAX_RETRIES = 3
+RETRY_BACKOFF = 5             # base backoff between retries (seconds)
+
+_semaphore = None
+_in_flight = set()
+
+
+def seconds_to_midnight(zone: str) -> float:
+    now = clock.now(pytz.timezone(zone))
+    midnight = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+async def _warm(key: tuple, date: datetime.date, deadline: float):
+    """Fetch one parameter tuple's timings for `date` with jitter and retry"""
+    global _semaphore
+    city, country, method, school = key
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    # Spread the fetches over the window so cities sharing a zone don't fire together
+    await asyncio.sleep(random.uniform(0, max(0, min(PREFETCH_INTERVAL, deadline - MIDNIGHT_MARGIN))))
+
+    try:
+        for attempt in range(1, MAX_RETRIES + 1):
+            async with _semaphore:
+                times = await asyncio.to_thread(get_prayer_times, city, country, date, method, school)
+            if times:
+                log.info("Prefetched %s for %s", key, date)
+                return
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1) + random.uniform(0, 1))
+        log.warning("Giving up prefetching %s for %s", key, date)
+    finally:
+        _in_flight.discard((key, date))
+
+
+async def prefetch_tomorrow(ctx: ContextTypes.DEFAULT_TYPE):
+    """Warm tomorrow's timings for every subscribed tuple about to reach local midnight"""
+    for key in list(index_for(ctx.application).chats):
+        city, country, method, school = key
+        zone = city_zone(city, country)
+        remaining = seconds_to_midnight(zone)
+        if remaining > PREFETCH_WINDOW or remaining < MIDNIGHT_MARGIN:
+            continue
+
+        tomorrow = (clock.now(pytz.timezone(zone)) + datetime.timedelta(days=1)).date()
+        if (key, tomorrow) in _in_flight or cached_prayer_times(city, country, tomorrow, method, school):
+            continue
+
+        _in_flight.add((key, tomorrow))
+        ctx.application.create_task(_warm(key, tomorrow, remaining))
+
+
+def schedule_prefetch(app):
+    app.job_queue.run_repeating(
+        prefetch_tomorrow,
+        interval=PREFETCH_INTERVAL,
+        first=30,
+        name="prefetch",
+    )
@@ -0,0 +1,101 @@
+"""
+On-demand sampling profiler and allocation snapshot for the live event loop.
+
+Nothing is installed until a profile is requested: a sampler thread reads the
+loop thread's stack from sys._current_frames() at a fixed interval while
+tracemalloc records allocations, and both stop when the profile ends.
+"""
+import asyncio
+import datetime
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+SAMPLE_INTERVAL = 0.005
+MAX_SECONDS = 120
+TOP_N = 25
+
+_lock = asyncio.Lock()
+
+
+def is_running() -> bool:
+    """Whether a profile is being taken right now"""
+    return _lock.locked()
+
+
+def _frame_key(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno} {code.co_name}"
+
+
+def _sample(thread_id: int, stop: threading.Event, own: Counter, total: Counter, counts: list):
+    while not stop.wait(SAMPLE_INTERVAL):
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            continue
+        counts[0] += 1
+        own[_frame_key(frame)] += 1
+        seen = set()
+        while frame is not None:
+            key = _frame_key(frame)
+            if key not in seen:
+                seen.add(key)
+                total[key] += 1
+            frame = frame.f_back
+
+
+async def run_profile(seconds: float) -> str:
+    """Profile the running loop for `seconds` and return a text report"""
+    seconds = max(1.0, min(float(seconds), MAX_SECONDS))
+    async with _lock:
+        own, total, counts = Counter(), Counter(), [0]
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=_sample,
+            args=(threading.get_ident(), stop, own, total, counts),
+            name="profiler",
+            daemon=True,
+        )
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        before = tracemalloc.take_snapshot()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stop.set()
+            sampler.join()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+        elapsed = time.perf_counter() - started
+
+    samples = counts[0] or 1
+    lines = [
+        f"Profile taken {datetime.datetime.now().isoformat(timespec='seconds')}",
+        f"Duration {elapsed:.1f}s, {counts[0]} samples every {SAMPLE_INTERVAL * 1000:.0f} ms",
+        "",
+        f"Top {TOP_N} functions by own time (top of stack):",
+    ]
+    for key, count in own.most_common(TOP_N):
+        lines.append(f"  {100 * count / samples:6.2f}%  {key}")
+    lines += ["", f"Top {TOP_N} functions by inclusive time (anywhere on stack):"]
+    for key, count in total.most_common(TOP_N):
+        lines.append(f"  {100 * count / samples:6.2f}%  {key}")
+
+    lines += ["", f"Top {TOP_N} allocation sites during the profile:"]
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+    for stat in stats[:TOP_N]:
+        frame = stat.traceback[0]
+        lines.append(
+            f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+            f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,133 @@
+"""
+Ramadan mode: whole Hijri months of imsak/Fajr/Maghrib precomputed per
+(city, country, method, school) in one upstream call, so countdowns and iftar
+alerts are answered from memory.
+"""
+import asyncio
+import datetime
+import logging
+import pytz
+import clock
+from telegram.ext import ContextTypes
+from config import RAMADAN_MODE
+from utils import _, hijri_date, city_date, city_zone, fetch_calendar
+from subscriptions import index_for, live_keys
+
+log = logging.getLogger(__name__)
+
+RAMADAN = 9
+PRECOMPUTE_INTERVAL = 6 * 3600
+MAX_CONCURRENCY = 4
+
+# (key, hijri year, hijri month) -> {"dd-mm-yyyy": {"Imsak", "Fajr", "Maghrib", "hijri"}}
+_tables = {}
+
+
+def is_active(date: datetime.date = None) -> bool:
+    """Whether Ramadan mode is on for the given (default: today's) date"""
+    if RAMADAN_MODE == "on":
+        return True
+    if RAMADAN_MODE == "off":
+        return False
+    return hijri_date(date or clock.today())[1] == RAMADAN
+
+
+def fetch_month(key: tuple, hijri_year: int, hijri_month: int) -> dict:
+    """Fetch a whole Hijri month for one parameter tuple and seed the daily cache"""
+    days = fetch_calendar("hijriCalendarByCity", key, hijri_year, hijri_month)
+    if days is None:
+        return None
+
+    table = {}
+    for _gregorian, timings, date in days:
+        hijri = date["hijri"]
+        table[date["gregorian"]["date"]] = {
+            "Imsak": timings.get("Imsak"),
+            "Fajr": timings.get("Fajr"),
+            "Maghrib": timings.get("Maghrib"),
+            "hijri": (int(hijri["year"]), int(hijri["month"]["number"]), int(hijri["day"])),
+        }
+
+    _tables[(key, hijri_year, hijri_month)] = table
+    log.info("Precomputed Hijri month %d/%d for %s (%d days)", hijri_month, hijri_year, key, len(table))
+    return table
+
+
+def day_entry(key: tuple, date: datetime.date = None) -> dict:
+    """Get a day's precomputed imsak/Fajr/Maghrib, or None if not loaded"""
+    city, country = key[0], key[1]
+    date = date or city_date(city, country)
+    year, month, _day = hijri_date(date)
+    day = date.strftime("%d-%m-%Y")
+    # The tabular date may be a day off at month edges, so check the neighbours too
+    for candidate in ((year, month), (year, month - 1) if month > 1 else (year - 1, 12),
+                      (year, month + 1) if month < 12 else (year + 1, 1)):
+        table = _tables.get((key, *candidate))
+        if table and day in table:
+            return table[day]
+    return None
+
+
+def _format_remaining(seconds: float, lang: str) -> str:
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return _("remaining_time", lang, hours, minutes)
+
+
+def countdown_text(key: tuple, lang: str) -> str:
+    """Imsak/iftar times with a countdown to the next one, from the table only"""
+    if not is_active():
+        return ""
+    entry = day_entry(key)
+    if not entry or not entry["Imsak"] or not entry["Maghrib"]:
+        return ""
+
+    zone = pytz.timezone(city_zone(key[0], key[1]))
+    now = clock.now(zone)
+
+    def at(t_str):
+        return zone.localize(datetime.datetime.combine(now.date(), datetime.datetime.strptime(t_str, "%H:%M").time()))
+
+    imsak, iftar = at(entry["Imsak"]), at(entry["Maghrib"])
+    if now < imsak:
+        target, label = imsak, _("imsak", lang)
+    elif now < iftar:
+        target, label = iftar, _("iftar", lang)
+    else:
+        return _("ramadan_times", lang, entry["Imsak"], entry["Maghrib"], "✅", _("iftar", lang))
+    remaining = _format_remaining((target - now).total_seconds(), lang)
+    return _("ramadan_times", lang, entry["Imsak"], entry["Maghrib"], remaining, label)
+
+
+async def precompute_tables(ctx: ContextTypes.DEFAULT_TYPE):
+    """Load the current Hijri month for every live parameter tuple while Ramadan mode is on"""
+    if not is_active():
+        return
+
+    live = index_for(ctx.application).chats
+    # Tables are shared by every bot in the process, so only drop ones no bot needs
+    needed = live_keys()
+    for stale in [table_key for table_key in _tables if table_key[0] not in needed]:
+        del _tables[stale]
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    async def load(key, year, month):
+        async with semaphore:
+            await asyncio.to_thread(fetch_month, key, year, month)
+
+    pending = []
+    for key in list(live):
+        year, month, _day = hijri_date(city_date(key[0], key[1]))
+        if (key, year, month) not in _tables:
+            pending.append(load(key, year, month))
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def schedule_ramadan(app):
+    app.job_queue.run_repeating(
+        precompute_tables,
+        interval=PRECOMPUTE_INTERVAL,
+        first=45,
+        name="ramadan",
+    )
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Replay a recorded or synthetic stream of updates through the real handlers
+and report per-handler latency, throughput and Bot API calls per update.
+
+Usage:
+    python3 replay.py updates.jsonl
+    python3 replay.py --synthetic 5000 --users 200 --offline
+    python3 replay.py --synthetic 1000 --record updates.jsonl
+"""
+import argparse
+import asyncio
+import functools
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from telegram import Update
+from telegram.ext import Application, ConversationHandler
+from config import MAJOR_CITIES
+from fake_api import FakeRequest, BOT_USER
+from callbacks import CallbackRouter, pack
+import handlers
+import jobs
+
+OFFLINE_TIMINGS = {
+    "Fajr": "04:30",
+    "Dhuhr": "12:00",
+    "Asr": "15:30",
+    "Maghrib": "18:15",
+    "Isha": "19:45",
+}
+
+COMMANDS = ["/start", "/today", "/settings", "/lang"]
+CALLBACKS = [("settings",), ("toggle_mute",), ("refresh",), ("choose_city",), ("toggle_lang",), ("close",),
+             ("toggle_school",), ("method", 4)]
+
+
+def _user(chat_id: int) -> dict:
+    return {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"}
+
+
+def _message(update_id: int, chat_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": _user(chat_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return message
+
+
+def _callback(update_id: int, chat_id: int, data: str) -> dict:
+    return {
+        "id": str(update_id),
+        "from": _user(chat_id),
+        "chat_instance": str(chat_id),
+        "data": data,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": "menu",
+        },
+    }
+
+
+def synthetic_stream(count: int, users: int, seed: int = 0):
+    """Yield a reproducible mix of commands and callback queries"""
+    rng = random.Random(seed)
+    cities = MAJOR_CITIES
+    for update_id in range(1, count + 1):
+        chat_id = 100000 + rng.randrange(users)
+        roll = rng.random()
+        if roll < 0.3:
+            yield {"update_id": update_id, "message": _message(update_id, chat_id, rng.choice(COMMANDS))}
+        elif roll < 0.5:
+            data = pack("city", rng.choice(cities))
+            yield {"update_id": update_id, "callback_query": _callback(update_id, chat_id, data)}
+        else:
+            data = pack(*rng.choice(CALLBACKS))
+            yield {"update_id": update_id, "callback_query": _callback(update_id, chat_id, data)}
+
+
+def load_stream(path: str):
+    """Yield update dicts from a JSONL file, one update per line"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _iter_handlers(app):
+    for group in app.handlers.values():
+        for handler in group:
+            if isinstance(handler, ConversationHandler):
+                yield from handler.entry_points
+                for state_handlers in handler.states.values():
+                    yield from state_handlers
+                yield from handler.fallbacks
+            else:
+                yield handler
+
+
+def _timed(callback, samples: dict):
+    @functools.wraps(callback)
+    async def timed(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            samples[callback.__name__].append(time.perf_counter() - start)
+
+    return timed
+
+
+def instrument(app, samples: dict):
+    """Wrap every handler callback so its wall time is recorded by name"""
+    for handler in _iter_handlers(app):
+        if isinstance(handler, CallbackRouter):
+            handler.routes = {action: _timed(cb, samples) for action, cb in handler.routes.items()}
+        else:
+            handler.callback = _timed(handler.callback, samples)
+
+
+def go_offline():
+    """Serve fixed timings so upstream latency does not skew the numbers"""
+    def fixed_prayer_times(city, country=None, *args, **kwargs):
+        return dict(OFFLINE_TIMINGS)
+
+    handlers.get_prayer_times = fixed_prayer_times
+    jobs.get_prayer_times = fixed_prayer_times
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def replay(stream, api_latency: float = 0.0):
+    request = FakeRequest(latency=api_latency)
+    app = (
+        Application.builder()
+        .token("0:replay")
+        .request(request)
+        .get_updates_request(FakeRequest())
+        .build()
+    )
+    handlers.setup_handlers(app)
+    samples = defaultdict(list)
+    instrument(app, samples)
+
+    await app.initialize()
+    request.calls.clear()
+
+    calls_per_update = []
+    methods = Counter()
+    processed = 0
+    started = time.perf_counter()
+    for data in stream:
+        update = Update.de_json(data, app.bot)
+        before = Counter(request.calls)
+        await app.process_update(update)
+        delta = request.calls - before
+        calls_per_update.append(sum(delta.values()))
+        methods.update(delta)
+        processed += 1
+    elapsed = time.perf_counter() - started
+
+    await app.shutdown()
+    return {
+        "processed": processed,
+        "elapsed": elapsed,
+        "samples": samples,
+        "calls_per_update": calls_per_update,
+        "methods": methods,
+    }
+
+
+def print_report(result):
+    processed = result["processed"]
+    elapsed = result["elapsed"]
+    print("📊 Replay report")
+    print("=" * 60)
+    print(f"Updates processed : {processed}")
+    print(f"Elapsed           : {elapsed:.3f}s")
+    if elapsed:
+        print(f"Throughput        : {processed / elapsed:.1f} updates/s")
+    if result["calls_per_update"]:
+        calls = result["calls_per_update"]
+        print(f"Bot API calls     : {sum(calls)} ({sum(calls) / len(calls):.2f}/update, max {max(calls)})")
+    print()
+    print(f"{'handler':<22}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    print("-" * 60)
+    rows = sorted(result["samples"].items(), key=lambda item: sum(item[1]), reverse=True)
+    for name, values in rows:
+        print(
+            f"{name:<22}{len(values):>8}"
+            f"{_percentile(values, 50) * 1000:>10.2f}"
+            f"{_percentile(values, 99) * 1000:>10.2f}"
+            f"{sum(values):>10.3f}"
+        )
+    print()
+    print("Bot API calls by method:")
+    for method, count in result["methods"].most_common():
+        print(f"  {method:<24}{count:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay updates through the bot handlers")
+    parser.add_argument("stream", nargs="?", help="JSONL file with one Telegram update per line")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate N synthetic updates")
+    parser.add_argument("--users", type=int, default=100, help="distinct chats in the synthetic stream")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record", help="write the synthetic stream to this JSONL file and exit")
+    parser.add_argument("--offline", action="store_true", help="do not call the Aladhan API")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="simulated Bot API latency in seconds")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        stream = synthetic_stream(args.synthetic, args.users, args.seed)
+    elif args.stream:
+        stream = load_stream(args.stream)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.record:
+        with open(args.record, "w", encoding="utf-8") as f:
+            for data in stream:
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        print(f"✅ Stream written to {args.record}")
+        return
+
+    if args.offline:
+        go_offline()
+
+    print_report(asyncio.run(replay(stream, args.api_latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Run the notification schedule on a virtual clock against the fake Bot API.
+
+Thousands of synthetic subscribers are spread over cities in several time
+zones (some with DST), their notify jobs are driven tick by tick on virtual
+time, and every delivered message is matched back to the true prayer time
+it announced. Some users pick only certain prayers or set quiet hours. The
+report lists delivery offsets and missed, unwanted and duplicate
+notifications; the exit status is non-zero if any check fails, so this can
+gate changes to jobs.py.
+
+Usage:
+    python3 simulate.py --days 1 --users 2000
+    python3 simulate.py --start 2025-03-25 --days 14 --users 5000
+"""
+import argparse
+import asyncio
+import datetime
+import functools
+import heapq
+import math
+import random
+import sys
+import time
+from collections import Counter
+import pytz
+from telegram.ext import Application
+import clock
+import jobs
+import utils
+from config import PRAYERS, ALL_PRAYERS, QUIET_WINDOWS
+from fake_api import FakeRequest
+from i18n import LOCALES
+from subscriptions import index_for
+from utils import hours_mask
+
+# (city, country, zone, base times in minutes after midnight)
+SIM_CITIES = [
+    ("Makkah", "Saudi Arabia", "Asia/Riyadh", (300, 740, 955, 1110, 1200)),
+    ("Cairo", "Egypt", "Africa/Cairo", (270, 720, 940, 1100, 1170)),
+    ("Istanbul", "Turkey", "Europe/Istanbul", (320, 790, 1010, 1180, 1260)),
+    ("London", "United Kingdom", "Europe/London", (200, 780, 1040, 1260, 1405)),
+    ("New York", "United States", "America/New_York", (250, 780, 1010, 1200, 1290)),
+    ("Jakarta", "Indonesia", "Asia/Jakarta", (275, 710, 915, 1080, 1150)),
+]
+SIM_METHODS = (5, 4, 13)
+MUTED_SHARE = 0.05
+PICKY_SHARE = 0.1         # users who only want some prayers
+QUIET_SHARE = 0.1         # users with quiet hours
+EARLIEST_OK = -60         # a prayer may be announced up to a minute early...
+LATEST_OK = 0             # ...but never after its time on an undisturbed run
+
+
+@functools.lru_cache(maxsize=None)
+def _sim_timings(key: tuple, date: datetime.date) -> tuple:
+    return tuple(sim_timings(key, date).items())
+
+
+def sim_timings(key: tuple, date: datetime.date) -> dict:
+    """Deterministic timings that drift with the season, like real ones do"""
+    city, country, method, school = key
+    base = next(times for name, _country, _zone, times in SIM_CITIES if name == city)
+    season = math.sin(2 * math.pi * (date.timetuple().tm_yday - 80) / 365)
+    drift = (-30 * season, 0, 10 * season, 30 * season, 35 * season)
+    times = {}
+    for prayer, minutes, shift in zip(PRAYERS, base, drift):
+        minutes = int(minutes + shift + method % 3 + 5 * school)
+        minutes = max(0, min(minutes, 23 * 60 + 59))
+        times[prayer] = f"{minutes // 60:02d}:{minutes % 60:02d}"
+    return times
+
+
+def go_offline(zones: dict):
+    """Serve sim_timings for the city's local date on the virtual clock"""
+    def prayer_times(city, country=None, date=None, method=5, school=0):
+        date = date or clock.now(zones[(city, country)]).date()
+        return dict(_sim_timings((city, country, method, school), date))
+
+    jobs.get_prayer_times = prayer_times
+    for city, country, zone, _times in SIM_CITIES:
+        utils.set_city_zone(city, country, zone)
+
+
+def _true_time(key: tuple, zone, local: datetime.datetime):
+    """(prayer, local date, offset in seconds) of the prayer nearest to `local`"""
+    best = None
+    for days in (-1, 0, 1):
+        date = local.date() + datetime.timedelta(days=days)
+        for prayer, athan in jobs._athan_times(zone, date, _sim_timings(key, date)):
+            offset = (local - athan).total_seconds()
+            if best is None or abs(offset) < abs(best[2]):
+                best = (prayer, date, offset)
+    return best
+
+
+async def simulate(start: datetime.datetime, days: float, users: int, seed: int = 0):
+    rng = random.Random(seed)
+    zones = {(city, country): pytz.timezone(zone) for city, country, zone, _times in SIM_CITIES}
+    virtual = clock.VirtualClock(start)
+    previous = clock.use(virtual)
+    go_offline(zones)
+
+    request = FakeRequest()
+    app = Application.builder().token("0:simulate").request(request).build()
+    await app.initialize()
+    index = index_for(app)
+    settings = {}
+    for chat_id in range(1, users + 1):
+        city, country, _zone, _times = rng.choice(SIM_CITIES)
+        data = {
+            "city": city,
+            "country": country,
+            "method": rng.choice(SIM_METHODS),
+            "school": rng.randrange(2),
+            "lang": rng.choice(list(LOCALES)),
+            "muted": rng.random() < MUTED_SHARE,
+            "prayers": rng.randrange(1, ALL_PRAYERS) if rng.random() < PICKY_SHARE else ALL_PRAYERS,
+            "quiet": hours_mask(rng.choice(QUIET_WINDOWS[1:])) if rng.random() < QUIET_SHARE else 0,
+        }
+        settings[chat_id] = data
+        index.subscribe(chat_id, data)
+
+    # Drive every scheduled job on virtual time, each at a random phase within its interval
+    end = start + datetime.timedelta(days=days)
+    queue = []
+    for seq, job in enumerate(app.job_queue.jobs()):
+        interval = job.job.trigger.interval
+        heapq.heappush(queue, (start + interval * rng.random(), seq, job, interval))
+
+    runs = 0
+    sent_before = 0
+    deliveries = Counter()
+    offsets = []
+    worst = []
+    started = time.perf_counter()
+    while queue and queue[0][0] < end:
+        moment, seq, job, interval = heapq.heappop(queue)
+        virtual.set(moment)
+        await job.callback(app.context_types.context.from_job(job, app))
+        runs += 1
+        heapq.heappush(queue, (moment + interval, seq, job, interval))
+
+        for _method, chat_id, _text, timestamp in request.sent[sent_before:]:
+            key = index.keys[chat_id]
+            zone = zones[key[:2]]
+            local = datetime.datetime.fromtimestamp(timestamp, zone)
+            prayer, date, offset = _true_time(key, zone, local)
+            deliveries[(chat_id, date, prayer)] += 1
+            offsets.append(offset)
+            if not EARLIEST_OK <= offset <= LATEST_OK:
+                worst.append((offset, chat_id, key[0], date, prayer))
+        sent_before = len(request.sent)
+    elapsed = time.perf_counter() - started
+
+    # Every unmuted chat should get each prayer it chose, outside its quiet hours, once on
+    # every local day fully inside the window, and nothing else on those days
+    expected = set()
+    checked = set()
+    for chat_id, key in index.keys.items():
+        data = settings[chat_id]
+        zone = zones[key[:2]]
+        day = start.astimezone(zone).date() + datetime.timedelta(days=1)
+        while zone.localize(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time())) <= end:
+            checked.add((chat_id, day))
+            for bit, (prayer, t_str) in enumerate(_sim_timings(key, day)):
+                if not data["muted"] and data["prayers"] >> bit & 1 and not data["quiet"] >> int(t_str[:2]) & 1:
+                    expected.add((chat_id, day, prayer))
+            day += datetime.timedelta(days=1)
+    unwanted = {item for item in deliveries if item[:2] in checked and item not in expected}
+
+    await app.shutdown()
+    clock.use(previous)
+    return {
+        "users": users,
+        "keys": len(queue),
+        "days": days,
+        "runs": runs,
+        "elapsed": elapsed,
+        "sent": len(request.sent),
+        "offsets": offsets,
+        "out_of_window": sorted(worst, key=lambda item: -abs(item[0])),
+        "missed": sorted(expected - deliveries.keys()),
+        "unwanted": sorted(unwanted),
+        "duplicates": sorted(item for item, count in deliveries.items() if count > 1),
+    }
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def print_report(result) -> bool:
+    """Print the report; True if every check passed"""
+    print("🕰️ Virtual-time notification report")
+    print("=" * 60)
+    print(f"Subscribers       : {result['users']} over {result['keys']} parameter tuples")
+    print(f"Virtual time      : {result['days']:g} days, {result['runs']} job runs")
+    print(f"Wall time         : {result['elapsed']:.2f}s")
+    print(f"Messages sent     : {result['sent']}")
+    offsets = result["offsets"]
+    if offsets:
+        print(
+            f"Offset from athan : min {min(offsets):+.0f}s  p50 {_percentile(offsets, 50):+.0f}s  "
+            f"p95 {_percentile(offsets, 95):+.0f}s  max {max(offsets):+.0f}s"
+        )
+    print()
+    checks = [
+        (f"outside {EARLIEST_OK:+d}..{LATEST_OK:+d}s", result["out_of_window"]),
+        ("missed", result["missed"]),
+        ("unwanted", result["unwanted"]),
+        ("duplicates", result["duplicates"]),
+    ]
+    ok = True
+    for label, items in checks:
+        print(f"{'✅' if not items else '❌'} {label:<20}: {len(items)}")
+        for item in items[:5]:
+            print(f"     {item}")
+        ok = ok and not items
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay notification schedules on a virtual clock")
+    parser.add_argument("--start", help="UTC start date YYYY-MM-DD (default: today)")
+    parser.add_argument("--days", type=float, default=1.0)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    day = datetime.date.fromisoformat(args.start) if args.start else datetime.date.today()
+    start = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+    result = asyncio.run(simulate(start, args.days, args.users, args.seed))
+    sys.exit(0 if print_report(result) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -93,7 +93,8 @@ def run_bot_with_restart():
                 restart_count += 1
                 
                 if restart_count < max_restarts:
-                    wait_time = min(30, 5 * restart_count)  # Progressive backoff
+                    # Restart the first crash immediately, back off only if it keeps failing
+                    wait_time = min(30, 5 * (restart_count - 1))  # Progressive backoff
                     log.info(f"⏳ Waiting {wait_time} seconds before restart...")
                     time.sleep(wait_time)
                 else:
@@ -108,7 +109,7 @@ def run_bot_with_restart():
             restart_count += 1
             
             if restart_count < max_restarts:
-                wait_time = min(30, 5 * restart_count)
+                wait_time = min(30, 5 * (restart_count - 1))
                 log.info(f"⏳ Waiting {wait_time} seconds before restart...")
                 time.sleep(wait_time)
             else:
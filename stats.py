@@ -0,0 +1,70 @@
+"""
+Rolling per-day, per-prayer delivery counters behind /stats, kept per application
+"""
+import datetime
+import threading
+from collections import Counter, OrderedDict
+from weakref import WeakKeyDictionary
+import clock
+
+KEEP_DAYS = 7
+
+
+class DailyDeliveries:
+    """Sent/failed counts per prayer for the last `days` days"""
+
+    def __init__(self, days: int = KEEP_DAYS):
+        self.days = days
+        self._days = OrderedDict()     # "YYYY-MM-DD" -> (sent Counter, failed Counter)
+        self._lock = threading.Lock()
+
+    def record(self, prayer: str, ok: bool, day: datetime.date = None):
+        day = (day or clock.today()).isoformat()
+        with self._lock:
+            if day not in self._days:
+                self._days[day] = (Counter(), Counter())
+                while len(self._days) > self.days:
+                    self._days.popitem(last=False)
+            sent, failed = self._days[day]
+            (sent if ok else failed)[prayer] += 1
+
+    def snapshot(self) -> list:
+        """[(day, sent Counter, failed Counter)] oldest first"""
+        with self._lock:
+            return [(day, Counter(sent), Counter(failed)) for day, (sent, failed) in self._days.items()]
+
+    def totals(self) -> tuple:
+        """Per-prayer sent and failed counts summed over the window"""
+        sent, failed = Counter(), Counter()
+        for _day, day_sent, day_failed in self.snapshot():
+            sent.update(day_sent)
+            failed.update(day_failed)
+        return sent, failed
+
+
+class BotStats:
+    """Delivery figures and fan-out counters of one application"""
+
+    def __init__(self):
+        self.deliveries = DailyDeliveries()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def get(self, name: str, **labels) -> int:
+        with self._lock:
+            return self._counters[(name, tuple(sorted(labels.items())))]
+
+
+_stats = WeakKeyDictionary()
+
+
+def stats_for(app) -> BotStats:
+    """Get (or create) the /stats figures of an application"""
+    stats = _stats.get(app)
+    if stats is None:
+        stats = _stats[app] = BotStats()
+    return stats
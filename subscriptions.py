@@ -0,0 +1,282 @@
+"""
+Subscriber index keyed by (city, country, method, school).
+
+Chats that share the same calculation parameters share one cached fetch and
+one repeating fan-out job, so upstream calls and timers scale with the number
+of distinct parameter tuples rather than with the number of subscribers.
+
+Direct subscribers are also mirrored into ``bot_data["subscribers"]`` as
+compact tuples, which is all the fan-out and restore paths need; the full
+per-user dicts can then stay on disk (see lazy_persistence).
+"""
+import logging
+from collections import Counter
+from weakref import WeakKeyDictionary
+from config import PRAYERS, ALL_PRAYERS
+from utils import calc_params
+
+log = logging.getLogger(__name__)
+
+NOTIFY_INTERVAL = 60
+
+_indexes = WeakKeyDictionary()
+
+
+def params_key(data: dict) -> tuple:
+    """Build the (city, country, method, school) key of a subscriber record"""
+    method, school = calc_params(data)
+    return data["city"], data.get("country", ""), method, school
+
+
+def flags_of(data: dict) -> tuple:
+    """(lang, muted, iftar_alert, prayers bitmask, quiet-hours bitmask) of a subscriber"""
+    return (
+        data.get("lang", "ar"), bool(data.get("muted")), bool(data.get("iftar_alert")),
+        data.get("prayers", ALL_PRAYERS), data.get("quiet", 0),
+    )
+
+
+def compact_record(data: dict) -> tuple:
+    """(city, country, method, school, lang, muted, iftar_alert, prayers, quiet) of a subscriber"""
+    return params_key(data) + flags_of(data)
+
+
+def expand_record(record: tuple) -> dict:
+    # Records saved before per-prayer settings existed have no prayers/quiet fields
+    city, country, method, school, lang, muted, iftar_alert, prayers, quiet = record + (ALL_PRAYERS, 0)[len(record) - 7:]
+    return {
+        "city": city, "country": country, "method": method, "school": school,
+        "lang": lang, "muted": muted, "iftar_alert": iftar_alert, "prayers": prayers, "quiet": quiet,
+    }
+
+
+def job_name(key: tuple) -> str:
+    return "notify:" + "|".join(str(part) for part in key)
+
+
+class SubscriptionIndex:
+    """Maps each parameter tuple to the chats subscribed with it"""
+
+    def __init__(self, app):
+        self.app = app
+        self.chats = {}    # key -> set of chat ids
+        self.keys = {}     # chat id -> key
+        self.broadcasts = set()   # channel/group chat ids
+        self.fired = {}           # key -> (local date, set of prayers already announced)
+        # Fan-out audiences kept in step with every settings change, so notify never filters per chat
+        self.audience = {}        # key -> one set per prayer of unmuted chats that want it
+        self.quiet = {}           # key -> {chat id: quiet-hours mask} for chats that set one
+        # Counters kept in step with every change so /stats never scans user_data
+        self.flags = {}           # chat id -> (lang, muted, iftar_alert)
+        self.city_counts = Counter()
+        self.lang_counts = Counter()
+        self.muted_count = 0
+
+    def subscribe(self, chat_id: int, data: dict, broadcast: bool = False) -> tuple:
+        """Register a chat under the key of its current settings"""
+        key = params_key(data)
+        if self.keys.get(chat_id) != key:
+            self.unsubscribe(chat_id)
+            self.keys[chat_id] = key
+            self.city_counts[key[0]] += 1
+            members = self.chats.setdefault(key, set())
+            members.add(chat_id)
+            if len(members) == 1:
+                self._schedule(key)
+        if broadcast:
+            self.broadcasts.add(chat_id)
+        self.dormant.pop(chat_id, None)
+        self.update_flags(chat_id, data)
+        return key
+
+    def unsubscribe(self, chat_id: int):
+        """Remove a chat, dropping its key's timer if it was the last member"""
+        key = self.keys.pop(chat_id, None)
+        self.broadcasts.discard(chat_id)
+        if key is None:
+            return
+        flags = self.flags.pop(chat_id, None)
+        self._count_flags(flags, -1)
+        self._place(chat_id, key, flags, remove=True)
+        self.records.pop(chat_id, None)
+        self.city_counts[key[0]] -= 1
+        if not self.city_counts[key[0]]:
+            del self.city_counts[key[0]]
+        members = self.chats.get(key)
+        if members is not None:
+            members.discard(chat_id)
+            if not members:
+                del self.chats[key]
+                for job in self.app.job_queue.get_jobs_by_name(job_name(key)):
+                    job.schedule_removal()
+
+    @property
+    def records(self) -> dict:
+        """Persisted compact records of direct (non-broadcast) subscribers"""
+        return self.app.bot_data.setdefault("subscribers", {})
+
+    @property
+    def dormant(self) -> dict:
+        """Compact records of chats Telegram stopped delivering to, kept for their next /start"""
+        return self.app.bot_data.setdefault("dormant", {})
+
+    def prune(self, chat_id: int) -> bool:
+        """Take a blocked, deactivated or deleted chat out of the fan-out; False if it wasn't in it"""
+        if chat_id not in self.keys:
+            return False
+        if chat_id in self.broadcasts:
+            # A group/channel that removed the bot has to be set up again with /broadcast
+            self.app.bot_data.get("broadcasts", {}).pop(chat_id, None)
+        elif chat_id in self.records:
+            self.dormant[chat_id] = self.records[chat_id]
+        self.unsubscribe(chat_id)
+        return True
+
+    def migrate(self, chat_id: int, new_chat_id: int) -> bool:
+        """Move a group that was upgraded to a supergroup to its new id; False if it wasn't in the fan-out"""
+        if chat_id not in self.keys:
+            return False
+        if chat_id in self.broadcasts:
+            broadcasts = self.app.bot_data.setdefault("broadcasts", {})
+            record = broadcasts.pop(chat_id, None)
+            if record is not None:
+                broadcasts[new_chat_id] = record
+                self.subscribe(new_chat_id, record, broadcast=True)
+        elif chat_id in self.records:
+            self.subscribe(new_chat_id, expand_record(self.records[chat_id]))
+        # Subscribed under the new id first, so the key keeps its member and its timer
+        self.unsubscribe(chat_id)
+        return True
+
+    def revive(self, chat_id: int, data: dict) -> bool:
+        """Resubscribe a dormant chat, from its full record if loaded, else its compact one"""
+        record = self.dormant.get(chat_id)
+        if record is None:
+            return False
+        self.subscribe(chat_id, data if data.get("city") else expand_record(record))
+        return True
+
+    def update_flags(self, chat_id: int, data: dict):
+        """Refresh a subscriber's language and mute counters after its record changed"""
+        if chat_id not in self.keys:
+            return
+        if chat_id not in self.broadcasts:
+            self.records[chat_id] = compact_record(data)
+        flags = flags_of(data)
+        old = self.flags.get(chat_id)
+        if old == flags:
+            return
+        key = self.keys[chat_id]
+        self._count_flags(old, -1)
+        self._place(chat_id, key, old, remove=True)
+        self.flags[chat_id] = flags
+        self._count_flags(flags, 1)
+        self._place(chat_id, key, flags)
+
+    def _count_flags(self, flags, delta: int):
+        if flags is None:
+            return
+        lang, muted = flags[:2]
+        self.lang_counts[lang] += delta
+        if not self.lang_counts[lang]:
+            del self.lang_counts[lang]
+        self.muted_count += delta * muted
+
+    def _place(self, chat_id: int, key: tuple, flags, remove: bool = False):
+        """Add a chat to (or remove it from) its key's per-prayer audiences and quiet-hour map"""
+        if flags is None:
+            return
+        _lang, muted, _iftar_alert, prayers, quiet = flags
+        if muted:
+            return
+        audience = self.audience.get(key)
+        if audience is None:
+            audience = self.audience[key] = tuple(set() for _prayer in PRAYERS)
+        for bit, members in enumerate(audience):
+            if prayers >> bit & 1:
+                if remove:
+                    members.discard(chat_id)
+                else:
+                    members.add(chat_id)
+        if quiet:
+            quiet_chats = self.quiet.setdefault(key, {})
+            if remove:
+                quiet_chats.pop(chat_id, None)
+                if not quiet_chats:
+                    del self.quiet[key]
+            else:
+                quiet_chats[chat_id] = quiet
+        if remove and not any(audience):
+            del self.audience[key]
+
+    def _schedule(self, key: tuple):
+        from jobs import notify
+        self.app.job_queue.run_repeating(
+            notify,
+            interval=NOTIFY_INTERVAL,
+            first=10,
+            name=job_name(key),
+            data=key,
+        )
+
+    def mark_fired(self, key: tuple, day: str, prayer: str) -> bool:
+        """Record that a prayer was announced; False if it already was today"""
+        fired_day, prayers = self.fired.get(key, (None, set()))
+        if fired_day != day:
+            prayers = set()
+            self.fired[key] = (day, prayers)
+        if prayer in prayers:
+            return False
+        prayers.add(prayer)
+        return True
+
+    def export_fired(self) -> list:
+        """Scheduler state handed to a replacement process on restart"""
+        return [[list(key), day, sorted(prayers)] for key, (day, prayers) in self.fired.items()]
+
+    def import_fired(self, state: list):
+        for key, day, prayers in state:
+            for prayer in prayers:
+                self.mark_fired(tuple(key), day, prayer)
+
+    def members(self, key: tuple) -> set:
+        return self.chats.get(key, set())
+
+    def recipients(self, key: tuple, prayer: str, hour: int) -> list:
+        """Chats of a key that want `prayer` outside their quiet hours, channel/group chats first
+        so one post reaches most people soonest"""
+        audience = self.audience.get(key)
+        if not audience:
+            return []
+        chats = audience[PRAYERS.index(prayer)]
+        quiet = self.quiet.get(key)
+        if quiet:
+            chats = chats - {chat_id for chat_id, mask in quiet.items() if mask >> hour & 1}
+        return [c for c in chats if c in self.broadcasts] + [c for c in chats if c not in self.broadcasts]
+
+    def stats(self) -> dict:
+        """Summary of how many parameter tuples are live and how much they share"""
+        subscribers = len(self.keys)
+        tuples = len(self.chats)
+        return {
+            "subscribers": subscribers,
+            "broadcasts": len(self.broadcasts),
+            "tuples": tuples,
+            "cities": len({key[:2] for key in self.chats}),
+            "shared_ratio": round(subscribers / tuples, 2) if tuples else 0,
+            "muted": self.muted_count,
+            "dormant": len(self.dormant),
+        }
+
+
+def index_for(app) -> SubscriptionIndex:
+    """Get (or create) the subscription index of an application"""
+    index = _indexes.get(app)
+    if index is None:
+        index = _indexes[app] = SubscriptionIndex(app)
+    return index
+
+
+def live_keys() -> set:
+    """Parameter tuples with subscribers in any application of this process"""
+    return set().union(*(index.chats for index in list(_indexes.values())))
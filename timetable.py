@@ -0,0 +1,255 @@
+"""
+/timetable: a city's month as a printable sheet (PNG with Pillow, else PDF)
+and an .ics calendar.
+
+A month is fetched in one calendar call, which also seeds the daily cache.
+Rendered files are cached by (city, country, method, school, year, month,
+lang, format), with no lang for the printable sheet, which is always in
+English, and so is the Telegram file_id returned by the first upload
+(in bot_data, so it survives restarts). Later requests for the same month
+resend that file_id with no rendering and no upload.
+"""
+import asyncio
+import datetime
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+import pytz
+from telegram import Update, InputFile
+from telegram.error import BadRequest
+from telegram.ext import ContextTypes
+from config import PRAYERS
+from i18n import locale
+from utils import _, user_lang, city_name, calc_params, guess_country, city_date, city_zone, fetch_calendar
+import metrics
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow is optional; without it the printable sheet is a PDF
+    Image = None
+
+log = logging.getLogger(__name__)
+
+MAX_RENDERED = 64
+EVENT_MINUTES = 15
+
+# (city, country, method, school, year, month) -> [(date, {prayer: "HH:MM"})]
+_months = OrderedDict()
+# file key -> rendered bytes
+_rendered = OrderedDict()
+
+
+def _remember(cache: OrderedDict, key, value):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > MAX_RENDERED:
+        cache.popitem(last=False)
+
+
+def fetch_month(key: tuple, year: int, month: int) -> list:
+    """Fetch one Gregorian month of timings for a parameter tuple and seed the daily cache"""
+    cached = _months.get(key + (year, month))
+    if cached:
+        return cached
+    days = fetch_calendar("calendarByCity", key, year, month)
+    if days is None:
+        return None
+    rows = [(date, {prayer: timings[prayer] for prayer in PRAYERS}) for date, timings, _date in days]
+    _remember(_months, key + (year, month), rows)
+    log.info("Fetched calendar %d-%02d for %s (%d days)", year, month, key, len(rows))
+    return rows
+
+
+def _latin(text: str) -> str:
+    """The text if the built-in fonts can draw it, else empty (the caption carries the title)"""
+    try:
+        text.encode("latin-1")
+        return text
+    except UnicodeEncodeError:
+        return ""
+
+
+def _title(city: str, year: int, month: int) -> str:
+    name = _latin(city)
+    return f"{name} - {year}-{month:02d}" if name else f"{year}-{month:02d}"
+
+
+def render_ics(city: str, zone: str, rows: list, lang: str) -> bytes:
+    """One VEVENT per prayer, in UTC so no VTIMEZONE block is needed"""
+    tz = pytz.timezone(zone)
+    names = locale(lang).prayers
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    uid_base = hashlib.sha1(f"{city}|{zone}".encode()).hexdigest()[:12]
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//azan-notifier-telegram-bot//timetable//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{city}",
+        f"X-WR-TIMEZONE:{zone}",
+    ]
+    for date, times in rows:
+        for prayer in PRAYERS:
+            local = datetime.datetime.combine(date, datetime.datetime.strptime(times[prayer], "%H:%M").time())
+            start = tz.localize(local).astimezone(pytz.utc)
+            end = start + datetime.timedelta(minutes=EVENT_MINUTES)
+            lines += [
+                "BEGIN:VEVENT",
+                f"UID:{uid_base}-{date:%Y%m%d}-{prayer.lower()}@azan-bot",
+                f"DTSTAMP:{stamp}",
+                f"DTSTART:{start:%Y%m%dT%H%M%SZ}",
+                f"DTEND:{end:%Y%m%dT%H%M%SZ}",
+                f"SUMMARY:{names[prayer]} - {city}",
+                "END:VEVENT",
+            ]
+    lines.append("END:VCALENDAR")
+    return ("\r\n".join(lines) + "\r\n").encode("utf-8")
+
+
+def _table(rows: list) -> list:
+    header = ["Date", "Day"] + list(PRAYERS)
+    return [header] + [[date.strftime("%d/%m"), date.strftime("%a")] + [times[p] for p in PRAYERS] for date, times in rows]
+
+
+def render_png(city: str, year: int, month: int, rows: list) -> bytes:
+    col_width, row_height, margin = 90, 26, 30
+    table = _table(rows)
+    width = margin * 2 + col_width * len(table[0])
+    height = margin * 2 + row_height * (len(table) + 1)
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+    draw.text((margin, margin), _title(city, year, month), fill="black", font=font)
+    for r, row in enumerate(table):
+        y = margin + row_height * (r + 1)
+        if r == 0 or row[1] == "Fri":
+            draw.rectangle([margin, y, width - margin, y + row_height], fill="#e8f0e8" if r else "#c8dcc8")
+        for c, cell in enumerate(row):
+            draw.text((margin + c * col_width + 6, y + 7), cell, fill="black", font=font)
+    out = io.BytesIO()
+    image.save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(city: str, year: int, month: int, rows: list) -> bytes:
+    """A one-page A4 table drawn with the built-in Helvetica font, no dependencies"""
+    col_width, row_height, left, top = 72, 22, 46, 790
+    table = _table(rows)
+    ops = ["BT", "/F2 16 Tf", f"{left} {top} Td", f"({_pdf_escape(_title(city, year, month))}) Tj", "ET"]
+    for r, row in enumerate(table):
+        y = top - 36 - r * row_height
+        if r == 0 or row[1] == "Fri":
+            shade = "0.78 0.86 0.78" if r == 0 else "0.91 0.94 0.91"
+            ops.append(f"{shade} rg {left - 4} {y - 6} {col_width * len(row)} {row_height} re f 0 g")
+        for c, cell in enumerate(row):
+            ops += ["BT", f"/F{2 if r == 0 else 1} 11 Tf", f"{left + c * col_width} {y} Td", f"({_pdf_escape(cell)}) Tj", "ET"]
+    content = "\n".join(ops).encode("latin-1")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>",
+    ]
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def printable_format() -> str:
+    return "png" if Image is not None else "pdf"
+
+
+def _render(fmt: str, key: tuple, year: int, month: int, lang: str, rows: list) -> bytes:
+    city, country = key[0], key[1]
+    if fmt == "ics":
+        return render_ics(city, city_zone(city, country), rows, lang)
+    if fmt == "png":
+        return render_png(city, year, month, rows)
+    return render_pdf(city, year, month, rows)
+
+
+def _filename(city: str, year: int, month: int, fmt: str) -> str:
+    slug = "-".join(_latin(city).lower().split())
+    return f"timetable-{slug + '-' if slug else ''}{year}-{month:02d}.{fmt}"
+
+
+async def _send(context, chat_id: int, fmt: str, file: object, filename: str, caption: str):
+    if fmt == "png":
+        message = await context.bot.send_photo(chat_id, photo=file, caption=caption, parse_mode="Markdown")
+        return message.photo[-1].file_id
+    message = await context.bot.send_document(
+        chat_id, document=file, caption=caption, parse_mode="Markdown",
+        filename=None if isinstance(file, str) else filename,
+    )
+    return message.document.file_id
+
+
+async def timetable_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send this month's printable timetable and .ics for the user's city"""
+    lang = user_lang(context)
+    data = context.user_data
+    if not data.get("city"):
+        await update.message.reply_text(_("no_city", lang))
+        return
+
+    city = data["city"]
+    country = data.get("country") or guess_country(city)
+    method, school = calc_params(data)
+    key = (city, country, method, school)
+    today = city_date(city, country)
+    year, month = today.year, today.month
+    caption = _("timetable_caption", lang, city_name(city, lang), f"{month:02d}/{year}")
+    files = context.bot_data.setdefault("timetable_files", {})
+    rows = None
+
+    for fmt in (printable_format(), "ics"):
+        # Only the .ics is localized; the printable sheet is the same file in every language
+        file_key = key + (year, month, lang if fmt == "ics" else None, fmt)
+        file_id = files.get(file_key)
+        if file_id:
+            try:
+                await _send(context, update.effective_chat.id, fmt, file_id, None, caption)
+                metrics.inc("timetable_sent", source="file_id", format=fmt)
+                continue
+            except BadRequest as e:
+                # The file_id stopped being valid; fall through and upload again
+                log.warning("Cached timetable file_id rejected (%s), re-uploading", e)
+                files.pop(file_key, None)
+
+        content = _rendered.get(file_key)
+        source = "bytes"
+        if content is None:
+            if rows is None:
+                rows = await asyncio.to_thread(fetch_month, key, year, month)
+            if not rows:
+                await update.message.reply_text(_("error_fetch", lang))
+                return
+            content = await asyncio.to_thread(_render, fmt, key, year, month, lang, rows)
+            _remember(_rendered, file_key, content)
+            source = "render"
+
+        filename = _filename(city, year, month, fmt)
+        file_id = await _send(context, update.effective_chat.id, fmt, InputFile(content, filename=filename), filename, caption)
+        # Earlier months are never asked for again
+        for stale in [k for k in files if k[4:6] < (year, month)]:
+            del files[stale]
+        files[file_key] = file_id
+        metrics.inc("timetable_sent", source=source, format=fmt)
@@ -1,13 +1,29 @@
 import datetime
 import pytz
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import logging
-from config import TEXTS
+import threading
+import clock
+from config import DEFAULT_METHOD, DEFAULT_SCHOOL, PRAYERS
+from i18n import locale
+from gazetteer import country_of
+
+log = logging.getLogger(__name__)
 
 def _(key: str, lang: str = "ar", *args, **kwargs) -> str:
     """Get localized text"""
-    return TEXTS[key][lang].format(*args, **kwargs)
+    text, fmt = locale(lang).templates[key]
+    return fmt(*args, **kwargs) if fmt else text
+
+def city_name(city: str, lang: str) -> str:
+    """A gazetteer city as the language's catalog labels it; cities it doesn't list keep their name"""
+    return locale(lang).city_names.get(city, city)
+
+def prayer_name(prayer: str, lang: str) -> str:
+    """Localized name of a prayer key such as Fajr"""
+    return locale(lang).prayers.get(prayer, prayer)
 
 def user_lang(ctx) -> str:
     """Get user's preferred language"""
@@ -15,66 +31,148 @@ def user_lang(ctx) -> str:
         return ctx.user_data.get("lang", "ar")
     return "ar"
 
+def calc_params(user_data) -> tuple:
+    """Get the (method, school) calculation parameters of a user"""
+    if not user_data:
+        return DEFAULT_METHOD, DEFAULT_SCHOOL
+    return user_data.get("method", DEFAULT_METHOD), user_data.get("school", DEFAULT_SCHOOL)
+
+def hours_mask(window) -> int:
+    """24-bit mask of the local hours in a (start, end) window, which may wrap past midnight"""
+    if not window:
+        return 0
+    start, end = window
+    hours = range(start, end) if start < end else list(range(start, 24)) + list(range(0, end))
+    return sum(1 << hour for hour in hours)
+
+def hijri_date(date: datetime.date) -> tuple:
+    """Convert a Gregorian date to (year, month, day) on the tabular Islamic calendar.
+
+    Purely arithmetic, so it never calls the API; it may differ from the
+    sighted calendar by a day, which the precomputed Ramadan tables correct.
+    """
+    l = date.toordinal() + 1721425 - 1948440 + 10632
+    n = (l - 1) // 10631
+    l = l - 10631 * n + 354
+    j = ((10985 - l) // 5316) * ((50 * l) // 17719) + (l // 5670) * ((43 * l) // 15238)
+    l = l - ((30 - j) // 15) * ((17719 * j) // 50) - (j // 16) * ((15238 * j) // 43) + 29
+    month = (24 * l) // 709
+    day = l - (709 * month) // 24
+    return 30 * n + j - 30, month, day
+
+def hijri_str(lang: str, hijri: tuple) -> str:
+    """Render a (year, month, day) Hijri date"""
+    year, month, day = hijri
+    return f"{day} {locale(lang).hijri_months[month - 1]} {year} {_('hijri_suffix', lang)}"
+
 def today_str(lang: str) -> str:
     """Get today's date string in the specified language"""
-    ar_days = ["الاثنين", "الثلاثاء", "الأربعاء", "الخميس", "الجمعة", "السبت", "الأحد"]
-    en_days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-    now = datetime.datetime.now(pytz.timezone("Africa/Cairo"))
-    day = ar_days[now.weekday()] if lang == "ar" else en_days[now.weekday()]
-    return f"{day}, {now.strftime('%d-%m-%Y')}"
+    now = clock.now(pytz.timezone("Africa/Cairo"))
+    day = locale(lang).weekdays[now.weekday()]
+    return f"{day}, {now.strftime('%d-%m-%Y')} | {hijri_str(lang, hijri_date(now.date()))}"
 
 def format_timings(times: dict, lang: str) -> str:
     """Format prayer times for display"""
-    if lang == "en":
-        return (
-            f"🌅 **Fajr**: {times['Fajr']}\n"
-            f"☀️ **Dhuhr**: {times['Dhuhr']}\n"
-            f"🌇 **Asr**: {times['Asr']}\n"
-            f"🌆 **Maghrib**: {times['Maghrib']}\n"
-            f"🌙 **Isha**: {times['Isha']}"
-        )
-    return (
-        f"🌅 **الفجر**: {times['Fajr']}\n"
-        f"☀️ **الظهر**: {times['Dhuhr']}\n"
-        f"🌇 **العصر**: {times['Asr']}\n"
-        f"🌆 **المغرب**: {times['Maghrib']}\n"
-        f"🌙 **العشاء**: {times['Isha']}"
-    )
-
-def get_prayer_times(city, country=None):
+    return _("timings", lang, **times)
+
+DEFAULT_ZONE = "Africa/Cairo"
+
+# One connection pool to Aladhan for every bot and job in the process
+http = requests.Session()
+http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# local date -> {(city, country, method, school): timings}, shared by every handler and job;
+# bucketing by day lets pruning drop whole days instead of scanning every entry
+_timings_cache = {}
+_prune_lock = threading.Lock()
+_pruned_on = None
+# (city, country) -> IANA zone name reported by Aladhan
+_city_zones = {}
+
+def guess_country(city: str) -> str:
+    """Guess the country of a well-known city"""
+    country = country_of(city)
+    if country:
+        return country
+    city_lower = city.lower()
+    if city_lower in ['medina', 'madinah', 'makkah', 'mecca', 'riyadh', 'jeddah']:
+        return "Saudi Arabia"
+    elif city_lower in ['cairo', 'alexandria']:
+        return "Egypt"
+    elif city_lower in ['istanbul', 'ankara']:
+        return "Turkey"
+    elif city_lower in ['dubai', 'abu dhabi']:
+        return "UAE"
+    elif city_lower in ['doha']:
+        return "Qatar"
+    elif city_lower in ['kuwait']:
+        return "Kuwait"
+    return "Saudi Arabia"  # Default fallback
+
+def city_zone(city: str, country: str = None) -> str:
+    """Get the time zone of a city, falling back to Cairo until it is known"""
+    return _city_zones.get((city, country or guess_country(city)), DEFAULT_ZONE)
+
+def set_city_zone(city: str, country: str, zone: str):
+    """Remember the time zone Aladhan reported for a city"""
+    _city_zones[(city, country or guess_country(city))] = zone
+
+def city_date(city: str, country: str = None, days: int = 0) -> datetime.date:
+    """Get the local date in a city, optionally shifted by a number of days"""
+    now = clock.now(pytz.timezone(city_zone(city, country)))
+    return (now + datetime.timedelta(days=days)).date()
+
+def cached_prayer_times(city, country=None, date=None, method=DEFAULT_METHOD, school=DEFAULT_SCHOOL):
+    """Get prayer times from the cache only, never calling the API"""
+    country = country or guess_country(city)
+    date = date or city_date(city, country)
+    return _timings_cache.get(date, {}).get((city, country, method, school))
+
+def cache_prayer_times(city, country, date, method, school, times):
+    """Store timings obtained from a bulk source such as a monthly calendar"""
+    country = country or guess_country(city)
+    _timings_cache.setdefault(date, {})[(city, country, method, school)] = times
+
+def _prune_cache():
+    """Drop cached days older than yesterday, once per date change (fetches run on several threads)"""
+    global _pruned_on
+    today = clock.today()
+    if _pruned_on == today:
+        return
+    with _prune_lock:
+        if _pruned_on == today:
+            return
+        oldest = today - datetime.timedelta(days=1)
+        for day in [day for day in list(_timings_cache) if day < oldest]:
+            _timings_cache.pop(day, None)
+        _pruned_on = today
+
+def get_prayer_times(city, country=None, date=None, method=DEFAULT_METHOD, school=DEFAULT_SCHOOL):
     """Get prayer times for a city using the working HTTPS API"""
     
-    # Use HTTPS API with both city and country
-    url = "https://api.aladhan.com/v1/timingsByCity"
-    
     # Default country if not provided
     if not country:
-        # Try to guess country based on common cities
-        city_lower = city.lower()
-        if city_lower in ['medina', 'madinah', 'makkah', 'mecca', 'riyadh', 'jeddah']:
-            country = "Saudi Arabia"
-        elif city_lower in ['cairo', 'alexandria']:
-            country = "Egypt"
-        elif city_lower in ['istanbul', 'ankara']:
-            country = "Turkey"
-        elif city_lower in ['dubai', 'abu dhabi']:
-            country = "UAE"
-        elif city_lower in ['doha']:
-            country = "Qatar"
-        elif city_lower in ['kuwait']:
-            country = "Kuwait"
-        else:
-            country = "Saudi Arabia"  # Default fallback
+        country = guess_country(city)
+
+    date = date or city_date(city, country)
+    day = date.strftime("%d-%m-%Y")
+    cached = _timings_cache.get(date, {}).get((city, country, method, school))
+    if cached:
+        return cached
+
+    # Use HTTPS API with both city and country
+    url = f"https://api.aladhan.com/v1/timingsByCity/{day}"
     
     params = {
         "city": city,
         "country": country,
-        "method": 5  # University of Islamic Sciences, Karachi
+        "method": method,
+        "school": school,
     }
     
     try:
-        logging.info(f"Fetching prayer times for {city}, {country}")
-        response = requests.get(url, params=params, timeout=10)
+        log.info("Fetching prayer times for %s, %s on %s", city, country, day, extra={"sample_rate": 0.1})
+        response = http.get(url, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -90,19 +188,58 @@ def get_prayer_times(city, country=None):
                     "Maghrib": timings.get("Maghrib", "18:00"),
                     "Isha": timings.get("Isha", "19:30")
                 }
+
+                zone = data["data"].get("meta", {}).get("timezone")
+                if zone:
+                    set_city_zone(city, country, zone)
+                _prune_cache()
+                _timings_cache.setdefault(date, {})[(city, country, method, school)] = prayer_times
                 
-                logging.info(f"✅ Successfully fetched prayer times for {city}, {country}")
+                log.info("✅ Successfully fetched prayer times for %s, %s", city, country, extra={"sample_rate": 0.1})
                 return prayer_times
             else:
-                logging.error(f"API returned error: {data}")
+                log.error("API returned error: %s", data)
         else:
-            logging.error(f"HTTP error {response.status_code}: {response.text}")
+            log.error("HTTP error %s: %s", response.status_code, response.text)
             
     except requests.exceptions.RequestException as e:
-        logging.error(f"Network error fetching prayer times: {e}")
+        log.error("Network error fetching prayer times: %s", e)
     except Exception as e:
-        logging.error(f"Unexpected error fetching prayer times: {e}")
+        log.error("Unexpected error fetching prayer times: %s", e)
     
     # If all fails, return None (no fake data)
-    logging.error(f"❌ Failed to fetch real prayer times for {city}, {country}")
-    return None
\ No newline at end of file
+    log.error("❌ Failed to fetch real prayer times for %s, %s", city, country)
+    return None
+
+def fetch_calendar(endpoint: str, key: tuple, year: int, month: int) -> list:
+    """Fetch one month from an Aladhan calendar endpoint (calendarByCity, hijriCalendarByCity)
+    for a parameter tuple, seeding the daily cache and the city's zone.
+
+    Returns [(Gregorian date, {timing: "HH:MM"}, the day's "date" object)], or None on failure.
+    """
+    city, country, method, school = key
+    country = country or guess_country(city)
+    url = f"https://api.aladhan.com/v1/{endpoint}/{year}/{month}"
+    params = {"city": city, "country": country, "method": method, "school": school}
+
+    try:
+        response = http.get(url, params=params, timeout=20)
+        data = response.json() if response.status_code == 200 else {}
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log.error("Network error fetching %s %d/%d for %s: %s", endpoint, year, month, key, e)
+        return None
+    if data.get("code") != 200:
+        log.error("Calendar API error (%s) for %s: %s", endpoint, key, data)
+        return None
+
+    days = []
+    for day in data["data"]:
+        # Calendar endpoints append the zone, e.g. "04:12 (EET)"
+        timings = {name: value.split(" ")[0] for name, value in day["timings"].items()}
+        date = datetime.datetime.strptime(day["date"]["gregorian"]["date"], "%d-%m-%Y").date()
+        cache_prayer_times(city, country, date, method, school, {prayer: timings[prayer] for prayer in PRAYERS})
+        days.append((date, timings, day["date"]))
+    zone = data["data"][0].get("meta", {}).get("timezone") if data["data"] else None
+    if zone:
+        set_city_zone(city, country, zone)
+    return days